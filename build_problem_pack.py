@@ -0,0 +1,22 @@
+"""
+Compile test_cases/*.json into a binary problem pack (see problem_pack.py).
+
+The server memory-maps the pack at startup. Problems whose JSON file changed
+after the pack was built are read from the JSON instead, so a stale pack is
+never served; rebuild it to get the fast path back.
+
+Usage:
+    python build_problem_pack.py [--test-cases test_cases] [--output problems.pack]
+"""
+import argparse
+import os
+
+from problem_pack import PACK_FILE, write_pack
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile test_cases/*.json into a binary problem pack.")
+    parser.add_argument("--test-cases", default="test_cases", help="Directory of problem JSON files")
+    parser.add_argument("--output", default=PACK_FILE, help="Pack file to write")
+    args = parser.parse_args()
+    count = write_pack(args.test_cases, args.output)
+    print(f"✓ Packed {count} problems into {args.output} ({os.path.getsize(args.output) / 1024:.1f} KB)")
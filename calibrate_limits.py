@@ -0,0 +1,105 @@
+"""
+Calibrate per-problem time and memory limits from the reference solutions.
+
+For every problem in test_cases/ the matching reference solution in
+test_Codes/ is run against all tests, including the generated ones (see
+generators.py), on the grading workers. The slowest
+test and the highest peak memory are measured, multiplied by a safety factor
+and written back to the problem file as "time_limit_ms" / "memory_limit_mb".
+
+Usage:
+    python calibrate_limits.py [problem_id ...] [--time-multiplier 5] [--dry-run]
+"""
+import argparse
+import json
+import math
+import os
+
+from checkers import check
+from generators import find_reference
+from problem_registry import get_registry
+from worker_pool import get_pool, stop_pool
+
+TEST_CASES_DIR = "test_cases"
+# Generous limit while measuring; the reference should never get near it.
+CALIBRATION_TIMEOUT = 30
+
+
+def measure(problem, code: str, runs: int):
+    """
+    Run the reference `runs` times against every test of `problem`, generated
+    ones included, and return (max wall seconds, max peak KB), or None if the
+    reference does not pass every test.
+    """
+    problem.materialize()
+    checker = problem.data.get("checker")
+    max_wall = 0.0
+    max_peak_kb = 0
+    for _ in range(runs):
+        results = get_pool().run_batch(code, problem.inputs, timeout=CALIBRATION_TIMEOUT)
+        for i, (expected, result) in enumerate(zip(problem.expected_outputs, results)):
+            if result["status"] != "ok" or not check(checker, result["stdout"], expected):
+                print(f"  ✗ Reference fails test {i+1} ({result['status']})")
+                return None
+            max_wall = max(max_wall, result.get("wall_time") or 0.0)
+            max_peak_kb = max(max_peak_kb, result.get("peak_memory_kb") or 0)
+    return max_wall, max_peak_kb
+
+
+def calibrate(problem_ids=None, time_multiplier=5.0, memory_multiplier=2.0,
+              min_time_ms=250, min_memory_mb=64, runs=3, dry_run=False):
+    files = sorted(f for f in os.listdir(TEST_CASES_DIR) if f.endswith(".json"))
+    for file in files:
+        problem_id = file[:-len(".json")]
+        if problem_ids and problem_id not in problem_ids:
+            continue
+        path = os.path.join(TEST_CASES_DIR, file)
+        with open(path, "r") as f:
+            test_data = json.load(f)
+
+        reference = find_reference(problem_id, test_data)
+        if reference is None:
+            print(f"⚠ {problem_id}: no reference solution found, skipping")
+            continue
+        with open(reference, "r") as f:
+            code = f.read()
+
+        print(f"• {problem_id}: measuring {reference}")
+        measured = measure(get_registry().get(problem_id), code, runs)
+        if measured is None:
+            print(f"⚠ {problem_id}: reference solution does not pass its own tests, skipping")
+            continue
+        max_wall, max_peak_kb = measured
+
+        time_limit_ms = max(min_time_ms, math.ceil(max_wall * 1000 * time_multiplier))
+        memory_limit_mb = max(min_memory_mb, math.ceil(max_peak_kb / 1024 * memory_multiplier))
+        print(f"✓ {problem_id}: slowest test {max_wall * 1000:.1f} ms, peak {max_peak_kb / 1024:.1f} MB"
+              f" -> time_limit_ms={time_limit_ms}, memory_limit_mb={memory_limit_mb}")
+        if dry_run:
+            continue
+
+        # Keep "problem_id" first and the limits right after it.
+        updated = {"problem_id": test_data.get("problem_id", problem_id),
+                   "time_limit_ms": time_limit_ms,
+                   "memory_limit_mb": memory_limit_mb}
+        updated.update((k, v) for k, v in test_data.items() if k not in updated)
+        with open(path, "w") as f:
+            json.dump(updated, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate per-problem limits from reference solutions.")
+    parser.add_argument("problems", nargs="*", help="Problem ids to calibrate (default: all)")
+    parser.add_argument("--time-multiplier", type=float, default=5.0)
+    parser.add_argument("--memory-multiplier", type=float, default=2.0)
+    parser.add_argument("--min-time-ms", type=int, default=250)
+    parser.add_argument("--min-memory-mb", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3, help="Measurements per problem; the worst is kept")
+    parser.add_argument("--dry-run", action="store_true", help="Print limits without writing them")
+    args = parser.parse_args()
+    try:
+        calibrate(args.problems, args.time_multiplier, args.memory_multiplier,
+                  args.min_time_ms, args.min_memory_mb, args.runs, args.dry_run)
+    finally:
+        stop_pool()
@@ -0,0 +1,111 @@
+"""
+Per-test-case outcome statistics used to order fail-fast grading.
+
+Every graded test records whether it passed, timed out, and how much CPU it
+took. In fail-fast mode the first failure ends grading, so the cases are run
+in decreasing order of failure probability per unit of cost: a case that
+rejects most wrong submissions, or one that is almost free, goes first.
+
+Statistics are keyed by problem id and the hash of the test's input and
+expected output (see result_cache.case_hash), so editing a test starts its
+history over. They live in memory and are saved to a small JSON file at
+most every GRADER_STATS_SAVE_INTERVAL seconds, and on shutdown.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+STATS_FILE = os.environ.get("GRADER_STATS_FILE", ".grader_stats.json")
+SAVE_INTERVAL = float(os.environ.get("GRADER_STATS_SAVE_INTERVAL", 30))
+# Cost assumed for a case that has never been run, in seconds of CPU.
+DEFAULT_COST = 0.001
+
+
+class CaseStats:
+    def __init__(self, path=STATS_FILE, save_interval=SAVE_INTERVAL):
+        self.path = path
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        # problem_id -> case digest -> [runs, failures, timeouts, total cpu seconds]
+        self._stats = self._load()
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def record(self, problem_id: str, case_digest: str, passed: bool, timed_out: bool, cpu_time: float):
+        with self._lock:
+            entry = self._stats.setdefault(problem_id, {}).setdefault(case_digest, [0, 0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += 0 if passed else 1
+            entry[2] += 1 if timed_out else 0
+            entry[3] += cpu_time or 0.0
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= self.save_interval
+        if due:
+            self.save()
+
+    def order(self, problem_id: str, case_digests) -> list:
+        """
+        Return the indexes of `case_digests` in the order they should run.
+
+        Cases are sorted by estimated failure probability divided by average
+        cost. Unseen cases get an even failure prior and the problem's mean
+        cost; ties keep file order.
+        """
+        with self._lock:
+            known = self._stats.get(problem_id, {})
+            entries = [known.get(digest) for digest in case_digests]
+        costs = [entry[3] / entry[0] for entry in entries if entry and entry[0]]
+        mean_cost = sum(costs) / len(costs) if costs else DEFAULT_COST
+
+        def priority(i):
+            entry = entries[i]
+            runs, failures = (entry[0], entry[1]) if entry else (0, 0)
+            # Laplace smoothing keeps a single lucky pass from burying a case.
+            failure_rate = (failures + 1) / (runs + 2)
+            cost = entry[3] / runs if runs else mean_cost
+            return -failure_rate / max(cost, DEFAULT_COST)
+
+        return sorted(range(len(case_digests)), key=priority)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = json.dumps(self._stats)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Warning: Failed to save test statistics: {e}")
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_stats() -> CaseStats:
+    """Return the process-wide statistics, loading them on first use."""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = CaseStats()
+        return _stats
+
+
+def save_stats():
+    if _stats is not None:
+        _stats.save()
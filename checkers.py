@@ -0,0 +1,167 @@
+"""
+Output checkers: decide whether a submission's output is correct.
+
+A problem picks its checker with a "checker" field in test_cases/*.json,
+either a name or an object with options:
+
+    "checker": "tokens"
+    "checker": {"name": "float", "rel_tol": 1e-6, "abs_tol": 1e-9}
+    "checker": {"name": "unordered", "nested": true}
+
+Available checkers:
+
+- exact     - equal after stripping leading/trailing whitespace (the default)
+- tokens    - equal as sequences of whitespace-separated tokens
+- float     - tokens, with numeric tokens compared within a tolerance
+- json      - equal after parsing both sides as JSON (or Python literals),
+              so "[1, 2]", "[1,2]" and "[ 1,2 ]" all match. Types are kept
+              apart: true is not 1, and 2.0 is not 2.
+- unordered - like json, but lists match in any order; with "nested" the
+              order inside nested lists is ignored too. Output that does
+              not parse is compared as a multiset of lines.
+
+Checkers run in the server process on the captured stdout, for both
+/api/run and /api/submit. The output is controlled by the submission, so a
+checker that cannot make sense of it (too deeply nested, or holding values
+such as sets that have no JSON form) reports a mismatch instead of raising.
+"""
+import ast
+import json
+import math
+from collections import Counter
+
+DEFAULT_CHECKER = "exact"
+
+CHECKERS = {}
+
+
+def register(name: str):
+    """Register a checker `func(output, expected, **options) -> bool` under `name`."""
+    def decorator(func):
+        CHECKERS[name] = func
+        return func
+    return decorator
+
+
+@register("exact")
+def exact(output: str, expected: str) -> bool:
+    return output.strip() == expected.strip()
+
+
+@register("tokens")
+def tokens(output: str, expected: str) -> bool:
+    return output.split() == expected.split()
+
+
+def _float_equal(a: str, b: str, rel_tol: float, abs_tol: float) -> bool:
+    if a == b:
+        return True
+    try:
+        x, y = float(a), float(b)
+    except ValueError:
+        return False
+    if math.isnan(x) or math.isnan(y):
+        return math.isnan(x) and math.isnan(y)
+    return math.isclose(x, y, rel_tol=rel_tol, abs_tol=abs_tol)
+
+
+@register("float")
+def float_tolerance(output: str, expected: str, rel_tol: float = 1e-6, abs_tol: float = 1e-9) -> bool:
+    got, want = output.split(), expected.split()
+    return len(got) == len(want) and all(_float_equal(a, b, rel_tol, abs_tol) for a, b in zip(got, want))
+
+
+_UNPARSED = object()
+
+
+def _parse(text: str):
+    """Parse output as JSON, falling back to a Python literal (True, None, ...)."""
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except (ValueError, RecursionError):
+        pass
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return _UNPARSED
+
+
+def _normalize(value):
+    # Tuples print like lists in Python, so treat them the same.
+    if isinstance(value, tuple):
+        return [_normalize(item) for item in value]
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    return value
+
+
+@register("json")
+def json_equal(output: str, expected: str) -> bool:
+    got, want = _parse(output), _parse(expected)
+    if got is _UNPARSED or want is _UNPARSED:
+        return exact(output, expected)
+    try:
+        # Compare canonical JSON rather than with ==, which has True == 1 == 1.0.
+        return json.dumps(_normalize(got), sort_keys=True) == json.dumps(_normalize(want), sort_keys=True)
+    except (TypeError, ValueError, RecursionError):
+        # Values with no JSON form (sets, complex numbers) or nested too deeply.
+        return False
+
+
+def _canonical(value, nested: bool):
+    """A hashable, order-insensitive form of a parsed value."""
+    if isinstance(value, list):
+        items = [_canonical(item, nested) if nested else json.dumps(item, sort_keys=True) for item in value]
+        return tuple(sorted(items, key=repr))
+    if isinstance(value, dict):
+        return tuple(sorted((key, _canonical(item, nested)) for key, item in value.items()))
+    return json.dumps(value)
+
+
+@register("unordered")
+def unordered(output: str, expected: str, nested: bool = False) -> bool:
+    got, want = _parse(output), _parse(expected)
+    if got is _UNPARSED or want is _UNPARSED:
+        lines = lambda text: Counter(line.strip() for line in text.strip().splitlines())
+        return lines(output) == lines(expected)
+    try:
+        return _canonical(_normalize(got), nested) == _canonical(_normalize(want), nested)
+    except (TypeError, ValueError, RecursionError):
+        # Values with no JSON form (sets, complex numbers) or nested too deeply.
+        return False
+
+
+def resolve(spec):
+    """Return (name, options) for a problem's "checker" field."""
+    if spec is None:
+        return DEFAULT_CHECKER, {}
+    if isinstance(spec, str):
+        name, options = spec, {}
+    else:
+        options = dict(spec)
+        name = options.pop("name", DEFAULT_CHECKER)
+    if name not in CHECKERS:
+        raise ValueError(f"Unknown checker '{name}'")
+    return name, options
+
+
+def check(spec, output: str, expected: str) -> bool:
+    """
+    Whether `output` is correct for `expected` under the checker `spec`.
+
+    Output a checker cannot compare is a mismatch; only an invalid `spec`
+    raises.
+    """
+    name, options = resolve(spec)
+    try:
+        return CHECKERS[name](output, expected, **options)
+    except (TypeError, ValueError, RecursionError, MemoryError):
+        return False
+
+
+def is_exact(spec) -> bool:
+    """Whether `spec` compares by stripped equality, which allows stopping a test at the first mismatch."""
+    return resolve(spec)[0] == "exact"
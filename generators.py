@@ -0,0 +1,148 @@
+"""
+Seeded test-case generators for large hidden tests.
+
+Instead of writing stress tests by hand, a problem can declare generated
+tests in test_cases/*.json:
+
+    "generated_tests": [
+        {"generator": "random-ints", "seed": 1, "count": 2,
+         "params": {"n": 400, "low": -100, "high": 100}}
+    ]
+
+Each entry produces `count` tests from the registered generator, seeded by
+the generator name, the entry's seed and the test's position, so the same
+declaration always yields the same inputs. Expected outputs come from running
+the problem's reference solution in test_Codes/ (see find_reference).
+
+Nothing is generated at startup: the tests are materialized the first time a
+submission is graded and cached as JSON under .generated_tests/, keyed by
+generator name and version, seed, parameters and the reference solution's
+hash. Bumping a generator's version, changing its parameters or fixing the
+reference produces a new cache entry.
+"""
+import hashlib
+import json
+import os
+import random
+import tempfile
+
+from worker_pool import get_pool
+
+REFERENCE_DIR = "test_Codes"
+CACHE_DIR = os.environ.get("GENERATED_TESTS_DIR", ".generated_tests")
+# Generous per-test limit for the reference solution.
+GENERATION_TIMEOUT = 30
+
+GENERATORS = {}
+
+
+def find_reference(problem_id: str, test_data: dict):
+    """Locate the reference solution for a problem, or None."""
+    if test_data.get("reference_solution"):
+        return test_data["reference_solution"]
+    base = problem_id.replace("-", "_")
+    for name in (f"{base}.py", base, f"{base.rstrip('s')}.py"):
+        path = os.path.join(REFERENCE_DIR, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def register(name: str, version: int = 1):
+    """Register a generator `func(rng, **params) -> str` returning one raw test input."""
+    def decorator(func):
+        GENERATORS[name] = (func, version)
+        return func
+    return decorator
+
+
+@register("random-ints")
+def random_ints(rng, n=1000, low=-10**5, high=10**5):
+    """A count line followed by `n` space-separated integers."""
+    values = [str(rng.randint(low, high)) for _ in range(n)]
+    return f"{n}\n{' '.join(values)}\n"
+
+
+@register("sorted-list-and-target")
+def sorted_list_and_target(rng, n=1000, low=-10**6, high=10**6):
+    """A JSON list of `n` distinct sorted integers and a target on the next line."""
+    values = sorted(rng.sample(range(low, high), n))
+    return f"{json.dumps(values)}\n{rng.randint(low, high)}\n"
+
+
+def _cache_path(problem_id, spec, reference_hash):
+    name = spec["generator"]
+    _, version = GENERATORS[name]
+    params = json.dumps(spec.get("params", {}), sort_keys=True)
+    key = hashlib.sha256(f"{params}:{spec.get('count', 1)}:{reference_hash}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, problem_id, f"{name}-v{version}-s{spec.get('seed', 0)}-{key}.json")
+
+
+def _generate(problem_id, spec, transform, reference_code):
+    func, _ = GENERATORS[spec["generator"]]
+    raw_inputs = []
+    for position in range(spec.get("count", 1)):
+        rng = random.Random(f"{spec['generator']}:{spec.get('seed', 0)}:{position}")
+        raw_inputs.append(func(rng, **spec.get("params", {})))
+
+    results = get_pool().run_batch(reference_code, [transform(raw) for raw in raw_inputs],
+                                   timeout=GENERATION_TIMEOUT)
+    tests = []
+    for raw, result in zip(raw_inputs, results):
+        if result["status"] != "ok":
+            print(f"Warning: Reference solution failed on a generated test for {problem_id} "
+                  f"({result['status']}), dropping it")
+            continue
+        tests.append({"input": raw, "expected_output": result["stdout"]})
+    return tests, len(tests) == len(raw_inputs)
+
+
+def materialize(problem_id: str, data: dict, transform):
+    """
+    Return the generated tests declared by a problem, as test dicts.
+
+    `transform` turns a raw input into what the reference solution reads.
+    Cached tests are read from disk; missing ones are generated now.
+    """
+    specs = data.get("generated_tests", [])
+    if not specs:
+        return []
+
+    reference = find_reference(problem_id, data)
+    if reference is None:
+        print(f"Warning: No reference solution for {problem_id}, skipping its generated tests")
+        return []
+    with open(reference, "r") as f:
+        reference_code = f.read()
+    reference_hash = hashlib.sha256(reference_code.encode("utf-8")).hexdigest()
+
+    tests = []
+    for spec in specs:
+        if spec.get("generator") not in GENERATORS:
+            raise ValueError(f"Unknown test generator '{spec.get('generator')}' in {problem_id}")
+        path = _cache_path(problem_id, spec, reference_hash)
+        try:
+            with open(path, "r") as f:
+                tests.extend(json.load(f))
+            continue
+        except (OSError, ValueError):
+            pass
+
+        generated, complete = _generate(problem_id, spec, transform, reference_code)
+        tests.extend(generated)
+        if not complete:
+            continue
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(generated, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Failed to cache generated tests for {problem_id}: {e}")
+    return tests
+
+
+def declared_count(data: dict) -> int:
+    """How many tests a problem's "generated_tests" will produce."""
+    return sum(spec.get("count", 1) for spec in data.get("generated_tests", []))
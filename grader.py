@@ -1,112 +1,305 @@
-import subprocess
-import tempfile
 import json
-import uuid
 import os
+import threading
+import uuid
 from datetime import datetime
 
-def transform_input(problem_id: str, raw_input: str) -> str:
+from result_cache import get_cache, code_hash, case_hash, cache_key
+from worker_pool import get_pool
+from case_stats import get_stats
+from precompile import compile_submission, InvalidSubmission
+import checkers
+from problem_registry import get_registry
+
+# Per-test time limit in seconds, overridable per problem with "time_limit_ms".
+TIMEOUT_SECONDS = 5
+# Per-test memory limit in MB, overridable per problem with "memory_limit_mb".
+DEFAULT_MEMORY_LIMIT_MB = int(os.environ.get("GRADER_MEMORY_LIMIT_MB", 256))
+# Per-test cap on stdout/stderr in KB, overridable per problem with "output_limit_kb".
+DEFAULT_OUTPUT_LIMIT_KB = int(os.environ.get("GRADER_OUTPUT_LIMIT_KB", 1024))
+
+def problem_limits(test_data: dict):
+    """Return the (time limit in seconds, memory limit in MB) declared for a problem."""
+    time_limit_ms = test_data.get("time_limit_ms")
+    time_limit = time_limit_ms / 1000 if time_limit_ms else TIMEOUT_SECONDS
+    return time_limit, test_data.get("memory_limit_mb", DEFAULT_MEMORY_LIMIT_MB)
+
+def output_limit(test_data: dict) -> int:
+    """Return the per-test output cap in KB declared for a problem."""
+    return test_data.get("output_limit_kb", DEFAULT_OUTPUT_LIMIT_KB)
+
+def time_exceeded(result: dict, time_limit) -> bool:
+    """Whether a case timed out; cached results are checked against the current limit."""
+    return result["status"] == "timeout" or (result.get("wall_time") or 0.0) > time_limit
+
+def memory_exceeded(result: dict, memory_limit_mb) -> bool:
+    """Whether a case ran out of memory or peaked above the problem's limit."""
+    if result["status"] == "memory":
+        return True
+    peak_kb = result.get("peak_memory_kb")
+    return bool(memory_limit_mb) and peak_kb is not None and peak_kb > memory_limit_mb * 1024
+
+def _evaluate(i: int, case: dict, result: dict, time_limit=TIMEOUT_SECONDS, memory_limit_mb=None, checker=None):
+    """Return (passed, error_detail) for one executed test case."""
+    if time_exceeded(result, time_limit):
+        return False, f"Test {i+1}: Timeout (exceeded {time_limit:g} seconds)"
+    if memory_exceeded(result, memory_limit_mb):
+        return False, f"Test {i+1}: Memory limit exceeded ({memory_limit_mb} MB)"
+    if result["status"] == "output":
+        return False, f"Test {i+1}: {result['stderr'].strip().splitlines()[-1]}"
+    if result["status"] not in ("ok", "wrong"):
+        return False, f"Test {i+1}: Runtime error - {result['stderr'].strip()}"
+
+    if checkers.check(checker, result["stdout"], case["expected_output"]):
+        return True, None
+    user_output = result["stdout"].strip()
+    expected_output = case["expected_output"].strip()
+    return False, f"Test {i+1}: Expected '{expected_output}', got '{user_output}'"
+
+def resolve_fail_fast(value) -> object:
+    """Normalize a fail-fast setting to False, True (any failure) or "timeout"."""
+    if value == "timeout":
+        return "timeout"
+    return value is True
+
+def _stops_grading(fail_fast, result, expected_output, time_limit, memory_limit_mb, checker) -> bool:
+    """Whether a fail-fast run should stop after this result."""
+    if fail_fast == "timeout":
+        return time_exceeded(result, time_limit)
+    passed, _ = _evaluate(0, {"expected_output": expected_output}, result, time_limit, memory_limit_mb, checker)
+    return not passed
+
+class _InFlight:
+    """A grading run that identical concurrent requests can attach to."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.finished = {}
+        self.listeners = []
+        self.results = None
+        self.error = None
+
+    def publish(self, i, result):
+        with self.lock:
+            self.finished[i] = result
+            listeners = list(self.listeners)
+        for listener, coalesced in listeners:
+            listener(i, _copy(result, coalesced))
+
+    def follow(self, on_result, coalesced=False):
+        """
+        Replay results finished so far to `on_result` and subscribe it to the rest.
+
+        Results given to a `coalesced` caller, one that did not start the run,
+        are marked "coalesced" so that per-case stats count each run only once.
+        """
+        if on_result is None:
+            return
+        with self.lock:
+            replay = list(self.finished.items())
+            self.listeners.append((on_result, coalesced))
+        for i, result in replay:
+            on_result(i, _copy(result, coalesced))
+
+def _copy(result, coalesced):
+    return dict(result, coalesced=True) if coalesced else dict(result)
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def run_cases(code: str, problem_id: str, inputs, expected_outputs, on_result=None,
+              time_limit=TIMEOUT_SECONDS, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, fail_fast=False,
+              output_limit_kb=DEFAULT_OUTPUT_LIMIT_KB, checker=None, case_digests=None, stop_on_mismatch=True):
     """
-    Transform test case input to match expected format for specific problems.
+    Run `code` against every input, reusing cached results where possible.
+
+    Only the cases missing from the result cache are sent to a worker, as a
+    single batch. Concurrent calls for the same code and test cases share one
+    run instead of each starting their own. `on_result(index, result)` is
+    called for every case, cached or not. Returns the results in input order.
+
+    With `fail_fast` (True, or "timeout" to stop on timeouts only) nothing
+    more is run once a case fails, and the cases that were not run are None.
+
+    Output beyond `output_limit_kb` stops a case. `checker` is the problem's
+    output checker (see checkers.py); with the default "exact" checker a
+    case is also stopped, with status "wrong", as soon as its stdout can no
+    longer match. Pass `stop_on_mismatch=False` when the full output is
+    shown to the user, as /api/run does.
+
+    `case_digests` may pass the precomputed case_hash of each test.
+
+    Raises InvalidSubmission, without running anything, if the code does not
+    compile or defines no `solve`.
     """
-    if problem_id == "find-town-judge":
-        lines = raw_input.strip().split('\n')
-        
-        # Get n from first line
-        n = lines[0].strip() if len(lines) > 0 else "1"
-        
-        # Get trust array from second line (if exists)
-        trust_str = lines[1].strip() if len(lines) > 1 else "[]"
-        
-        # Parse the trust array
-        try:
-            trust = json.loads(trust_str)
-            m = len(trust)
-            
-            # Build the transformed input
-            transformed = f"{n} {m}"
-            for a, b in trust:
-                transformed += f"\n{a} {b}"
-            
-            return transformed
-        except Exception as e:
-            # If parsing fails, return original input
-            print(f"Warning: Failed to transform input for {problem_id}: {e}")
-            return raw_input
-    
-    # Add more problem-specific transformations here as needed
-    # elif problem_id == "another-problem":
-    #     ...
-    
-    return raw_input
-
-def grade_submission(code: str, problem_id: str, user_id: str):
+    bytecode = compile_submission(code)
+    digest = code_hash(code)
+    if case_digests is None:
+        case_digests = [case_hash(input_data, expected) for input_data, expected in zip(inputs, expected_outputs)]
+    flight_key = (digest, problem_id, tuple(case_digests), time_limit, memory_limit_mb, fail_fast,
+                  output_limit_kb, json.dumps(checker, sort_keys=True), stop_on_mismatch)
+
+    with _inflight_lock:
+        flight = _inflight.get(flight_key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[flight_key] = _InFlight()
+    flight.follow(on_result, coalesced=not leader)
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return [_copy(result, True) if result is not None else None for result in flight.results]
+
     try:
-        with open(f"test_cases/{problem_id}.json", "r") as f:
-            test_data = json.load(f)
-    except FileNotFoundError:
+        flight.results = _run_uncoalesced(code, bytecode, digest, problem_id, inputs, expected_outputs,
+                                          case_digests, flight.publish, time_limit, memory_limit_mb, fail_fast,
+                                          output_limit_kb, checker, stop_on_mismatch)
+        return flight.results
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[flight_key]
+        flight.done.set()
+
+def _run_uncoalesced(code, bytecode, digest, problem_id, inputs, expected_outputs, case_digests, on_result,
+                     time_limit, memory_limit_mb, fail_fast, output_limit_kb, checker, stop_on_mismatch):
+    results = [None] * len(inputs)
+    cache = get_cache()
+    keys = [cache_key(digest, problem_id, case_digest) for case_digest in case_digests]
+    # Stop at the first mismatch only where the exact checker decides the verdict.
+    early_stop = stop_on_mismatch and checkers.is_exact(checker)
+    if cache is not None:
+        for i, key in enumerate(keys):
+            cached = cache.get(key)
+            if cached is not None and cached["status"] == "wrong" and not early_stop:
+                # Its stdout was cut short at the first mismatch under the exact
+                # checker; run it again in full.
+                cached = None
+            if cached is not None:
+                cached["cached"] = True
+                results[i] = cached
+                on_result(i, cached)
+
+    pending = [i for i, result in enumerate(results) if result is None]
+
+    def stops(i, result):
+        return bool(fail_fast) and _stops_grading(fail_fast, result, expected_outputs[i],
+                                                  time_limit, memory_limit_mb, checker)
+
+    if any(result is not None and stops(i, result) for i, result in enumerate(results)):
+        # A cached case already failed; there is no point running the rest.
+        return results
+
+    def finish(j, result):
+        i = pending[j]
+        results[i] = result
+        if cache is not None:
+            cache.put(keys[i], result)
+        on_result(i, result)
+
+    if pending:
+        get_pool().run_batch(code, [inputs[i] for i in pending], timeout=time_limit,
+                             on_result=finish, memory_limit_mb=memory_limit_mb,
+                             stop_when=(lambda j, result: stops(pending[j], result)) if fail_fast else None,
+                             bytecode=bytecode, output_limit_kb=output_limit_kb,
+                             expected_outputs=[expected_outputs[i] for i in pending] if early_stop else None)
+    return results
+
+def summarize_metrics(results) -> dict:
+    """
+    Aggregate per-test resource usage for a submission.
+
+    CPU and wall times are summed over all tests that ran; memory is the
+    highest peak RSS seen. The total CPU time doubles as the leaderboard
+    tie-breaker.
+    """
+    ran = [(i, result) for i, result in enumerate(results) if result is not None]
+    tests = [{
+        "test_number": i + 1,
+        "status": result["status"],
+        "cpu_time": round(result.get("cpu_time") or 0.0, 4),
+        "wall_time": round(result.get("wall_time") or 0.0, 4),
+        "peak_memory_kb": result.get("peak_memory_kb")
+    } for i, result in ran]
+    peaks = [test["peak_memory_kb"] for test in tests if test["peak_memory_kb"] is not None]
+    return {
+        "cpu_time": round(sum(result.get("cpu_time") or 0.0 for _, result in ran), 3),
+        "wall_time": round(sum(result.get("wall_time") or 0.0 for _, result in ran), 3),
+        "peak_memory_kb": max(peaks) if peaks else None,
+        "tests": tests
+    }
+
+def grade_submission(code: str, problem_id: str, user_id: str, on_test_result=None, fail_fast=None):
+    """
+    Grade `code` against every public and hidden test of `problem_id`.
+
+    If `on_test_result` is given it is called with a small dict
+    ({"test_number", "passed", "status"}) as soon as each test finishes.
+    `fail_fast` (True, or "timeout") stops grading at the first failing or
+    timed-out test; when None the problem's own "fail_fast" setting is used.
+    Fail-fast runs start with the tests that historically fail most often
+    per unit of CPU (see case_stats.py).
+    """
+    problem = get_registry().get(problem_id)
+    if problem is None:
         raise FileNotFoundError(f"Test cases for '{problem_id}' not found.")
+    problem.materialize()
 
-    all_tests = test_data.get("public_tests", []) + test_data.get("hidden_tests", [])
+    test_data = problem.data
+    all_tests = problem.tests
     total_cases = len(all_tests)
-    passed_count = 0
-    error_details = []
-
-    for i, case in enumerate(all_tests):
-        tmp_file = None
-        try:
-            # Transform the input based on problem type
-            transformed_input = transform_input(problem_id, case["input"])
-            
-            with tempfile.NamedTemporaryFile(mode='w+', suffix='.py', delete=False) as tmp:
-                tmp_file = tmp.name
-                tmp.write(code + "\n")
-                tmp.write("""
-if __name__ == "__main__":
-    import sys
-    from io import StringIO
-
-    input_data = \"\"\"{}\"\"\"
-    sys.stdin = StringIO(input_data)
-
-    solve()
-""".format(transformed_input))
-                tmp.flush()
-
-            try:
-                result = subprocess.run(
-                    ["python", tmp_file],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                
-                if result.returncode != 0:
-                    error_details.append(f"Test {i+1}: Runtime error - {result.stderr.strip()}")
-                    continue
-                
-                user_output = result.stdout.strip()
-                expected_output = case["expected_output"].strip()
-
-                if user_output == expected_output:
-                    passed_count += 1
-                else:
-                    error_details.append(f"Test {i+1}: Expected '{expected_output}', got '{user_output}'")
-                    
-            except subprocess.TimeoutExpired:
-                error_details.append(f"Test {i+1}: Timeout (exceeded 5 seconds)")
-                continue
-            except Exception as e:
-                error_details.append(f"Test {i+1}: Execution error - {str(e)}")
-                continue
-                
-        finally:
-            # Clean up temporary file
-            if tmp_file and os.path.exists(tmp_file):
-                try:
-                    os.unlink(tmp_file)
-                except OSError:
-                    pass
+    time_limit, memory_limit_mb = problem_limits(test_data)
+    if fail_fast is None:
+        fail_fast = test_data.get("fail_fast", False)
+    fail_fast = resolve_fail_fast(fail_fast)
+    checker = test_data.get("checker")
+    outcomes = [None] * total_cases
+    results = [None] * total_cases
+    stats = get_stats()
+
+    # Inputs are transformed and hashed once, when the problem is loaded
+    inputs = problem.inputs
+    expected_outputs = problem.expected_outputs
+    case_digests = problem.case_digests
+    order = stats.order(problem_id, case_digests) if fail_fast else list(range(total_cases))
+
+    def record(position, result):
+        i = order[position]
+        passed, detail = _evaluate(i, all_tests[i], result, time_limit, memory_limit_mb, checker)
+        outcomes[i] = (passed, detail)
+        results[i] = result
+        if not result.get("cached") and not result.get("coalesced"):
+            stats.record(problem_id, case_digests[i], passed, result["status"] == "timeout",
+                         result.get("cpu_time"))
+        if on_test_result is not None:
+            on_test_result({"test_number": i + 1, "passed": passed, "status": result["status"]})
+
+    try:
+        run_cases(code, problem_id, [inputs[i] for i in order], [expected_outputs[i] for i in order],
+                  on_result=record, time_limit=time_limit, memory_limit_mb=memory_limit_mb, fail_fast=fail_fast,
+                  output_limit_kb=output_limit(test_data), checker=checker,
+                  case_digests=[case_digests[i] for i in order])
+    except InvalidSubmission as e:
+        # Rejected before running: one error instead of one per test.
+        outcomes = [(False, None)] * total_cases
+        compile_error = f"Compilation error - {e}"
+    else:
+        compile_error = None
+
+    ran = [outcome for outcome in outcomes if outcome is not None]
+    skipped = total_cases - len(ran)
+    passed_count = sum(1 for passed, _ in ran if passed)
+    error_details = [detail for passed, detail in ran if not passed and detail]
+    if compile_error:
+        error_details = [compile_error]
+    if skipped:
+        error_details.append(f"Stopped early (fail-fast): {skipped} remaining tests not run")
+    metrics = summarize_metrics(results)
 
     replay_result = "passed" if passed_count == total_cases else (
         "partially" if passed_count > 0 else "failed"
@@ -127,5 +320,8 @@ if __name__ == "__main__":
         "total": total_cases,
         "replay_result": replay_result,
         "submission_entry": submission_entry,
-        "error_details": error_details[:5]
+        "error_details": error_details[:5],
+        "skipped": skipped,
+        "execution_time": metrics["cpu_time"],
+        "metrics": metrics
     }
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+Parse, validate and compile submissions once, in the server process.
+
+Code that does not parse, or that defines no top-level `solve`, is rejected
+with a single error before any worker is involved. Valid code is compiled to
+a marshal'd code object that the sandbox workers load directly instead of
+compiling it again. Workers run the same interpreter as the server, so the
+bytecode is always compatible.
+
+Compiled code (and rejections) are kept in a small LRU keyed by the hash of
+the source, since the same code is typically run, then submitted, then
+resubmitted.
+"""
+import ast
+import hashlib
+import marshal
+import os
+import threading
+import traceback
+from collections import OrderedDict
+
+SOURCE_NAME = "solution.py"
+ENTRY_POINT = "solve"
+COMPILE_CACHE_ENTRIES = int(os.environ.get("GRADER_COMPILE_CACHE_ENTRIES", 256))
+
+
+class InvalidSubmission(Exception):
+    """Raised when a submission cannot be run at all."""
+
+
+def _defines(statements, name: str) -> bool:
+    # Look through module-level statements, including ones nested in
+    # if/try/with blocks, but not inside functions or classes.
+    for node in statements:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if node.name == name:
+                return True
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if any(isinstance(target, ast.Name) and target.id == name for target in targets):
+                return True
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            if any((alias.asname or alias.name) == name for alias in node.names):
+                return True
+        else:
+            for field in ("body", "orelse", "finalbody", "handlers"):
+                children = getattr(node, field, None)
+                if isinstance(children, list) and _defines(children, name):
+                    return True
+    return False
+
+
+def _compile(code: str) -> bytes:
+    try:
+        tree = ast.parse(code, SOURCE_NAME)
+        code_obj = compile(tree, SOURCE_NAME, "exec", dont_inherit=True)
+    except (SyntaxError, ValueError) as e:
+        raise InvalidSubmission("".join(traceback.format_exception_only(type(e), e)).strip())
+    except (MemoryError, RecursionError):
+        # Deeply nested expressions exhaust the parser or compiler stack.
+        raise InvalidSubmission("Code is too deeply nested to compile")
+    if not _defines(tree.body, ENTRY_POINT):
+        raise InvalidSubmission(f"No top-level '{ENTRY_POINT}' function defined")
+    return marshal.dumps(code_obj)
+
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def compile_submission(code: str) -> bytes:
+    """
+    Return the marshal'd code object for `code`.
+
+    Raises InvalidSubmission when the code has a syntax error, is too deeply
+    nested to compile, or defines no `solve`.
+    """
+    key = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    with _compiled_lock:
+        entry = _compiled.get(key)
+        if entry is not None:
+            _compiled.move_to_end(key)
+    if entry is None:
+        try:
+            entry = _compile(code)
+        except InvalidSubmission as e:
+            entry = e
+        with _compiled_lock:
+            _compiled[key] = entry
+            while len(_compiled) > COMPILE_CACHE_ENTRIES:
+                _compiled.popitem(last=False)
+    if isinstance(entry, InvalidSubmission):
+        raise InvalidSubmission(str(entry))
+    return entry
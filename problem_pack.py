@@ -0,0 +1,117 @@
+"""
+Binary problem pack: all of test_cases/ compiled into one indexed file.
+
+JSON files stay the authoring format; `python build_problem_pack.py` turns
+them into a pack that the problem registry memory-maps at startup. Test
+inputs are stored already transformed, so a hidden test's input is a slice
+of the mapping that is written to a worker's pipe without being copied or
+decoded, and every test's case hash is precomputed.
+
+Layout:
+
+    header   magic b"CCPPACK\\0", format version (u32), index length (u64)
+    index    UTF-8 JSON: {"problems": {problem_id: entry}}
+    data     raw bytes of every input and expected output, back to back
+
+Each entry keeps the problem's JSON fields except the tests, its
+"public_tests" as written (for /api/problem), the signature of the source
+file it was built from, and for every test the [offset, length] of its input
+and expected output in the data section plus its case hash.
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import input_transforms
+from result_cache import case_hash
+
+PACK_FILE = os.environ.get("PROBLEM_PACK", "problems.pack")
+MAGIC = b"CCPPACK\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">8sIQ")
+
+
+def source_signature(path: str):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def write_pack(test_cases_dir: str, output: str) -> int:
+    """Compile every problem in `test_cases_dir` into `output`; return how many were packed."""
+    problems = {}
+    chunks = []
+    offset = 0
+
+    def add(data: bytes):
+        nonlocal offset
+        chunks.append(data)
+        start, offset = offset, offset + len(data)
+        return [start, len(data)]
+
+    for file in sorted(os.listdir(test_cases_dir)):
+        if not file.endswith(".json"):
+            continue
+        problem_id = file[:-len(".json")]
+        path = os.path.join(test_cases_dir, file)
+        with open(path, "r") as f:
+            data = json.load(f)
+        tests = data.get("public_tests", []) + data.get("hidden_tests", [])
+        transform = data.get("input_transform")
+        packed_tests = []
+        for case in tests:
+            input_data = input_transforms.apply(transform, case["input"])
+            packed_tests.append({
+                "input": add(input_data.encode("utf-8")),
+                "expected": add(case["expected_output"].encode("utf-8")),
+                "digest": case_hash(input_data, case["expected_output"]),
+            })
+        problems[problem_id] = {
+            "meta": {key: value for key, value in data.items() if key not in ("public_tests", "hidden_tests")},
+            "public_tests": data.get("public_tests", []),
+            "has_tests": "public_tests" in data or "hidden_tests" in data,
+            "source": source_signature(path),
+            "tests": packed_tests,
+        }
+
+    index = json.dumps({"problems": problems}).encode("utf-8")
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(index)))
+            f.write(index)
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, output)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(problems)
+
+
+class ProblemPack:
+    """A memory-mapped pack file. Test inputs are returned as memoryviews into the mapping."""
+
+    def __init__(self, path: str):
+        self.path = path
+        stat = os.stat(path)
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} problem pack")
+        index_start = HEADER.size
+        self._data_start = index_start + index_length
+        self.problems = json.loads(self._map[index_start:self._data_start].decode("utf-8"))["problems"]
+        self._view = memoryview(self._map)
+
+    def blob(self, span) -> memoryview:
+        start, length = span
+        start += self._data_start
+        return self._view[start:start + length]
+
+    def text(self, span) -> str:
+        return str(self.blob(span), "utf-8")
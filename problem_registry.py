@@ -0,0 +1,251 @@
+"""
+In-memory registry of the problems in test_cases/.
+
+Every problem file is parsed once and kept with everything the endpoints and
+the grader derive from it: the transformed test inputs, the expected outputs,
+the test-case hashes used by the result cache, the test counts and the
+/api/problem response.
+
+Files are re-read when their mtime or size changes, checked with a stat on
+every lookup, and the directory listing is re-read when the directory's
+mtime changes, so adding, editing or removing a problem needs no restart.
+
+When a problem pack built by build_problem_pack.py is present, problems are
+served from the memory-mapped pack instead, as long as their JSON file is
+unchanged since the pack was built (or absent).
+"""
+import json
+import os
+import threading
+
+import generators
+import input_transforms
+from problem_pack import PACK_FILE, ProblemPack
+from result_cache import case_hash
+
+TEST_CASES_DIR = "test_cases"
+
+
+class Problem:
+    """A parsed problem file and the data precomputed from it."""
+
+    def __init__(self, problem_id: str, data: dict, signature, inputs, case_digests, listed: bool):
+        self.problem_id = problem_id
+        self.data = data
+        self.signature = signature
+        self.public_tests = data.get("public_tests", [])
+        self.hidden_tests = data.get("hidden_tests", [])
+        self.tests = self.public_tests + self.hidden_tests
+        # Transformed inputs: str, or memoryviews into a problem pack.
+        self.inputs = inputs
+        self.expected_outputs = [case["expected_output"] for case in self.tests]
+        self.case_digests = case_digests
+        # Whether the problem shows up in /api/problems.
+        self.listed = listed
+        # Generated tests (see generators.py) are added by materialize(),
+        # which also updates the counts in details.
+        self._materialized = generators.declared_count(data) == 0
+        self._materialize_lock = threading.Lock()
+        self.details = {
+            "problem_id": problem_id,
+            "public_tests": self.public_tests,
+            "hidden_tests_count": len(self.hidden_tests),
+            "total_tests": len(self.tests)
+        }
+
+    def materialize(self):
+        """Append the problem's generated hidden tests, generating them on first use."""
+        if self._materialized:
+            return
+        with self._materialize_lock:
+            if self._materialized:
+                return
+            transform = self.data.get("input_transform")
+            tests = generators.materialize(self.problem_id, self.data,
+                                           lambda raw: input_transforms.apply(transform, raw))
+            inputs = [input_transforms.apply(transform, case["input"]) for case in tests]
+            case_digests = [case_hash(input_data, case["expected_output"]) for input_data, case in zip(inputs, tests)]
+            self.hidden_tests = self.hidden_tests + tests
+            self.tests = self.tests + tests
+            self.inputs = self.inputs + inputs
+            self.expected_outputs = self.expected_outputs + [case["expected_output"] for case in tests]
+            self.case_digests = self.case_digests + case_digests
+            self.details = dict(self.details, hidden_tests_count=len(self.hidden_tests), total_tests=len(self.tests))
+            self._materialized = True
+
+    @classmethod
+    def from_json(cls, problem_id: str, data: dict, signature):
+        tests = data.get("public_tests", []) + data.get("hidden_tests", [])
+        transform = data.get("input_transform")
+        inputs = [input_transforms.apply(transform, case["input"]) for case in tests]
+        case_digests = [case_hash(input_data, case["expected_output"]) for input_data, case in zip(inputs, tests)]
+        return cls(problem_id, data, signature, inputs, case_digests,
+                   listed="public_tests" in data or "hidden_tests" in data)
+
+    @classmethod
+    def from_pack(cls, problem_id: str, entry: dict, pack: ProblemPack, signature):
+        data = dict(entry["meta"])
+        data["public_tests"] = entry["public_tests"]
+        # Hidden inputs stay in the pack; only what grading reads is decoded.
+        data["hidden_tests"] = [{"expected_output": pack.text(case["expected"])}
+                                for case in entry["tests"][len(entry["public_tests"]):]]
+        inputs = [pack.blob(case["input"]) for case in entry["tests"]]
+        case_digests = [case["digest"] for case in entry["tests"]]
+        return cls(problem_id, data, signature, inputs, case_digests, listed=entry["has_tests"])
+
+
+def _signature(stat):
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ProblemRegistry:
+    def __init__(self, directory=TEST_CASES_DIR, pack_path=PACK_FILE):
+        self.directory = directory
+        self.pack_path = pack_path
+        self._pack = None
+        self._pack_signature = None
+        self._problems = {}
+        # Files that failed to parse, kept so they aren't re-read until they change.
+        self._errors = {}
+        self._lock = threading.Lock()
+        # Sorted problem ids, re-read when the directory or the pack changes.
+        self._listing_signature = None
+        self._listing = []
+        self.reloads = 0
+
+    def _path(self, problem_id):
+        return os.path.join(self.directory, f"{problem_id}.json")
+
+    def _current_pack(self):
+        """The problem pack, re-mapped when the file is rebuilt; None if there is none."""
+        try:
+            signature = _signature(os.stat(self.pack_path))
+        except OSError:
+            signature = None
+        with self._lock:
+            if signature != self._pack_signature:
+                self._pack_signature = signature
+                self._pack = None
+                if signature is not None:
+                    try:
+                        self._pack = ProblemPack(self.pack_path)
+                    except (OSError, ValueError) as e:
+                        print(f"Warning: Ignoring problem pack {self.pack_path}: {e}")
+            return self._pack
+
+    def get(self, problem_id: str):
+        """
+        Return the Problem for `problem_id`, or None if it has neither a
+        file nor a pack entry.
+
+        Raises ValueError if the file exists but is not a valid problem.
+        """
+        if os.sep in problem_id or (os.altsep and os.altsep in problem_id):
+            return None
+        path = self._path(problem_id)
+        pack = self._current_pack()
+        entry = pack.problems.get(problem_id) if pack is not None else None
+        try:
+            signature = _signature(os.stat(path))
+        except OSError:
+            signature = None
+        if signature is None and entry is None:
+            with self._lock:
+                self._problems.pop(problem_id, None)
+                self._errors.pop(problem_id, None)
+            return None
+        if entry is not None and (signature is None or list(signature) == entry["source"]):
+            return self._get_packed(problem_id, entry, pack)
+
+        with self._lock:
+            problem = self._problems.get(problem_id)
+            error = self._errors.get(problem_id)
+        if problem is not None and problem.signature == signature:
+            return problem
+        if error is not None and error[0] == signature:
+            raise ValueError(error[1])
+
+        try:
+            with open(path, "r") as f:
+                problem = Problem.from_json(problem_id, json.load(f), signature)
+        except (ValueError, KeyError, TypeError) as e:
+            message = f"Invalid problem file {path}: {e}"
+            with self._lock:
+                self._errors[problem_id] = (signature, message)
+            raise ValueError(message)
+        with self._lock:
+            self._problems[problem_id] = problem
+            self._errors.pop(problem_id, None)
+            self.reloads += 1
+        return problem
+
+    def _get_packed(self, problem_id, entry, pack):
+        signature = ("pack", pack.signature)
+        with self._lock:
+            problem = self._problems.get(problem_id)
+        if problem is not None and problem.signature == signature:
+            return problem
+        problem = Problem.from_pack(problem_id, entry, pack, signature)
+        with self._lock:
+            self._problems[problem_id] = problem
+            self.reloads += 1
+        return problem
+
+    def load_all(self):
+        """Parse every problem file up front; bad files are reported and skipped."""
+        for problem_id in self._problem_ids():
+            try:
+                self.get(problem_id)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Failed to load problem '{problem_id}': {e}")
+        return self.list_payload()
+
+    def _problem_ids(self):
+        try:
+            files = os.listdir(self.directory)
+        except OSError:
+            files = []
+        problem_ids = {file[:-len(".json")] for file in files if file.endswith(".json")}
+        pack = self._current_pack()
+        if pack is not None:
+            problem_ids.update(pack.problems)
+        return sorted(problem_ids)
+
+    def list_payload(self) -> dict:
+        """The /api/problems response."""
+        pack = self._current_pack()
+        try:
+            directory_signature = _signature(os.stat(self.directory))
+        except OSError:
+            directory_signature = None
+        listing_signature = (directory_signature, pack.signature if pack is not None else None)
+        with self._lock:
+            stale = listing_signature != self._listing_signature
+        if stale:
+            problem_ids = self._problem_ids()
+            with self._lock:
+                self._listing, self._listing_signature = problem_ids, listing_signature
+        with self._lock:
+            problem_ids = self._listing
+        problems = []
+        for problem_id in problem_ids:
+            try:
+                problem = self.get(problem_id)
+            except (OSError, ValueError):
+                continue
+            if problem is not None and problem.listed:
+                problems.append(problem_id)
+        return {"problems": problems}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ProblemRegistry:
+    """Return the process-wide problem registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ProblemRegistry()
+        return _registry
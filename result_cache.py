@@ -0,0 +1,188 @@
+"""
+Content-addressed cache of per-test execution results.
+
+Classrooms and load tests submit byte-identical code over and over, so the
+raw outcome of running a piece of code against one test input is cached. The
+key combines the hash of the code (with line endings normalized), the problem id and the hash of the
+test's input and expected output, so:
+
+- results recorded by /api/run for public tests are reused by /api/submit,
+- editing a test in test_cases/ only changes the keys of the edited tests;
+  their stale entries are never looked up again and age out of the LRU.
+
+Entries live in a bounded in-memory LRU backed by a bounded directory of
+small JSON files. Only deterministic outcomes ("ok", "error" and "wrong") are
+cached; timeouts, worker crashes and cases killed by a signal ("killed", e.g.
+by the host's OOM killer) depend on the host and are always re-run. A "wrong" result was
+stopped at the first mismatch under the exact checker and its stdout is cut
+short, so it is only reused when the problem still uses the exact checker
+and the caller does not show the full output; otherwise it is a miss.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+CACHE_VERSION = 3
+CACHEABLE_STATUSES = ("ok", "error", "wrong")
+CACHED_FIELDS = ("status", "stdout", "stderr", "cpu_time", "wall_time", "peak_memory_kb")
+
+CACHE_ENABLED = os.environ.get("GRADER_CACHE", "1") != "0"
+CACHE_DIR = os.environ.get("GRADER_CACHE_DIR", ".grader_cache")
+MEMORY_ENTRIES = int(os.environ.get("GRADER_CACHE_MEMORY_ENTRIES", 10000))
+DISK_ENTRIES = int(os.environ.get("GRADER_CACHE_DISK_ENTRIES", 50000))
+# Outputs larger than this are not worth keeping around.
+MAX_OUTPUT_BYTES = int(os.environ.get("GRADER_CACHE_MAX_OUTPUT", 64 * 1024))
+
+
+def normalize_code(code: str) -> str:
+    """
+    Ignore line-ending differences between copies. Nothing else is touched:
+    whitespace inside a string literal can change what the code prints.
+    """
+    return code.replace("\r\n", "\n")
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(normalize_code(code).encode("utf-8")).hexdigest()
+
+
+def case_hash(input_data: str, expected_output: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(input_data.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(expected_output.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def cache_key(code_digest: str, problem_id: str, case_digest: str) -> str:
+    raw = f"v{CACHE_VERSION}:{code_digest}:{problem_id}:{case_digest}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory=CACHE_DIR, memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_count = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return dict(result)
+
+        result = self._read_disk(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, result)
+        return dict(result)
+
+    def put(self, key: str, result: dict):
+        if result.get("status") not in CACHEABLE_STATUSES:
+            return
+        if len(result.get("stdout", "")) + len(result.get("stderr", "")) > MAX_OUTPUT_BYTES:
+            return
+        entry = {name: result[name] for name in CACHED_FIELDS if name in result}
+        with self._lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    # --- Disk tier ---
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+            # Touch the file so disk eviction is least-recently-used.
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            existed = os.path.exists(path)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Failed to write grading cache entry: {e}")
+            return
+        if not existed:
+            self._count_new_disk_entry()
+
+    def _count_new_disk_entry(self):
+        with self._lock:
+            if self._disk_count is None:
+                self._disk_count = sum(1 for _ in self._disk_files())
+            else:
+                self._disk_count += 1
+            over_limit = self._disk_count > self.disk_entries
+        if over_limit:
+            self._evict_disk()
+
+    def _disk_files(self):
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith(".json"):
+                        yield entry
+
+    def _evict_disk(self):
+        # Evict down to 90% of the limit so eviction scans stay infrequent.
+        files = sorted(self._disk_files(), key=lambda entry: entry.stat().st_mtime)
+        target = int(self.disk_entries * 0.9)
+        removed = 0
+        for entry in files[:max(0, len(files) - target)]:
+            try:
+                os.unlink(entry.path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_count = len(files) - removed
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache, or None when caching is disabled."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
@@ -0,0 +1,467 @@
+"""
+Long-lived sandbox worker used by the grading pool (see worker_pool.py).
+
+The worker reads jobs from its stdin pipe and writes results to its stdout
+pipe. Every message is a 4-byte big-endian length, a UTF-8 JSON header and,
+when the header lists "payloads" (their sizes in bytes), that many raw byte
+strings back to back. A job looks like {"code": "...", "bytecode": true,
+"time_limit": 2.0, "memory_limit_mb": 256, "output_limit_kb": 1024,
+"step": false, "payloads": [...]}: the payloads are the marshal'd code (when "bytecode" is
+set; otherwise the code is compiled here) followed by one stdin payload per
+test. Test inputs therefore never go through JSON escaping. The code is run
+against every input. While a case runs, its stdout is forwarded as it
+arrives in {"index": i, "stdout": true} frames carrying one payload, and
+one reply per input is sent back as it finishes: {"index": i, "status":
+"ok" | "error" | "memory" | "output" | "timeout" | "stopped" | "killed", "stderr": "...",
+"cpu_time": s, "wall_time": s, "peak_memory_kb": kb}.
+
+Expected outputs never reach the worker, so a submission cannot read them.
+The pool compares the forwarded stdout itself and, once it can no longer
+match, writes the case index (4 bytes, big-endian) to the control pipe whose
+descriptor is the worker's first argument; the worker then kills the case
+and reports it as "stopped".
+
+The worker itself never runs submitted code. It is a fork server: every
+case runs in a fresh child forked from the pre-warmed worker, so nothing a
+submission changes (patched modules, the garbage collector, rlimits,
+os.environ, threads) outlives the case. The child's fd 0 is a memfd holding
+the input and fds 1 and 2 are pipes the worker reads, so sys.stdout.buffer,
+os.write(1, ...) and subprocesses' output are captured like print(). CPU
+time and peak memory come from the child's wait4() rusage.
+
+Output is capped: a case that prints more than "output_limit_kb" is killed
+with status "output". A case still running after the job's "time_limit"
+seconds is killed with status "timeout", so a timeout costs the worker
+nothing more than the killed child.
+
+Each case's child leads its own process group, which everything the
+submission forks joins. When the case ends the worker kills that group and
+reports in "reaped" whether anything was left in it. Before running a case
+the worker sends {"index": i, "pid": pid} so the pool can kill the group
+too if the worker itself hangs. The worker is
+started inside a private scratch directory (see worker_pool.py) whose
+contents are deleted after every job.
+"""
+import json
+import linecache
+import marshal
+import os
+import resource
+import select
+import shutil
+import signal
+import struct
+import sys
+import tempfile
+import time
+import traceback
+
+# Modules most submissions import; loading them once here is the "pre-warm".
+import bisect
+import collections
+import functools
+import heapq
+import itertools
+import math
+import re
+import string
+import typing
+
+HEADER = struct.Struct(">I")
+SOURCE_NAME = "solution.py"
+READ_SIZE = 65536
+# How often the worker checks whether a child has exited when no pidfd tells
+# it, e.g. while the child's own children hold its pipes open.
+POLL_INTERVAL = 0.05
+
+# Child exit codes.
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_MEMORY = 3
+
+
+def read_frame(stream):
+    """Read one message; returns (header, payloads) or (None, None) at EOF."""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None, None
+    (length,) = HEADER.unpack(header)
+    body = stream.read(length)
+    if len(body) < length:
+        return None, None
+    message = json.loads(body.decode("utf-8"))
+    payloads = []
+    for size in message.get("payloads", ()):
+        payload = stream.read(size)
+        if len(payload) < size:
+            return None, None
+        payloads.append(payload)
+    return message, payloads
+
+
+def write_frame(stream, message, payloads=()):
+    if payloads:
+        message = dict(message, payloads=[len(payload) for payload in payloads])
+    body = json.dumps(message).encode("utf-8")
+    stream.write(HEADER.pack(len(body)) + body)
+    for payload in payloads:
+        stream.write(payload)
+    stream.flush()
+
+
+def wipe_scratch(directory):
+    """Delete everything a submission left in the working directory."""
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.unlink(entry.path)
+        except OSError:
+            pass
+
+
+class _Capture:
+    """Output read from a child's pipe, capped at `limit` bytes and optionally forwarded with `on_data`."""
+
+    def __init__(self, limit=None, on_data=None):
+        self.limit = limit
+        self.on_data = on_data
+        self.size = 0
+        self.chunks = []
+        self.exceeded = False
+
+    def feed(self, data):
+        """Add a chunk; return False once the child should be stopped."""
+        if self.limit is not None and self.size + len(data) > self.limit:
+            data = data[:self.limit - self.size]
+            self.exceeded = True
+        self.size += len(data)
+        if self.on_data is not None:
+            if data:
+                self.on_data(data)
+        else:
+            self.chunks.append(data)
+        return not self.exceeded
+
+    def getvalue(self):
+        return b"".join(self.chunks).decode("utf-8", errors="replace")
+
+
+def _kill_group(pgid):
+    """SIGKILL process group `pgid`; return whether it still had members."""
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+        return True
+    except OSError:
+        return False
+
+
+def _format_exception(e):
+    # Drop the child's own frame so the traceback starts in the submission.
+    tb = e.__traceback__.tb_next if e.__traceback__ is not None else None
+    return "".join(traceback.format_exception(type(e), e, tb))
+
+
+def _proc_status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _limit_address_space(limit_mb):
+    """Cap how much more memory the process may map."""
+    current_kb = _proc_status_kb("VmSize")
+    if not limit_mb or current_kb is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = current_kb * 1024 + limit_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _stdin_file(input_data):
+    """A file descriptor, positioned at the start, holding `input_data`."""
+    try:
+        fd = os.memfd_create("stdin", os.MFD_CLOEXEC)
+    except (AttributeError, OSError):
+        f = tempfile.TemporaryFile()
+        fd = os.dup(f.fileno())
+        f.close()
+    view = memoryview(input_data)
+    while view:
+        view = view[os.write(fd, view):]
+    os.lseek(fd, 0, os.SEEK_SET)
+    return fd
+
+
+def _run_child(code_obj, stdin_fd, stdout_fd, stderr_fd, memory_limit_mb, private_fds):
+    """Run the submission in a forked child and exit with one of the EXIT_* codes. Never returns."""
+    code = EXIT_ERROR
+    try:
+        os.setpgid(0, 0)
+        os.dup2(stdin_fd, 0)
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        for fd in (stdin_fd, stdout_fd, stderr_fd, *private_fds):
+            os.close(fd)
+        sys.stdin = sys.__stdin__ = open(0, "r", encoding="utf-8", closefd=False)
+        sys.stdout = sys.__stdout__ = open(1, "w", encoding="utf-8", closefd=False)
+        sys.stderr = sys.__stderr__ = open(2, "w", encoding="utf-8", errors="backslashreplace",
+                                           closefd=False, buffering=1)
+        _limit_address_space(memory_limit_mb)
+        try:
+            namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+            exec(code_obj, namespace)
+            namespace["solve"]()
+            code = EXIT_OK
+        except SystemExit as e:
+            # Mirror the exit status a standalone `python solution.py` would have.
+            if e.code in (None, 0):
+                code = EXIT_OK
+            elif not isinstance(e.code, int):
+                sys.stderr.write(f"{e.code}\n")
+        except MemoryError:
+            code = EXIT_MEMORY
+        except BaseException as e:
+            sys.stderr.write(_format_exception(e))
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except BaseException:
+                pass
+    finally:
+        os._exit(code)
+
+
+def _drain(fd, capture):
+    """Read what is left in a pipe without waiting for writers that are still alive."""
+    os.set_blocking(fd, False)
+    try:
+        while True:
+            chunk = os.read(fd, READ_SIZE)
+            if not chunk or not capture.feed(chunk):
+                return
+    except (BlockingIOError, OSError):
+        pass
+
+
+def _open_pidfd(pid):
+    """A descriptor that becomes readable when `pid` exits, or None where Linux or Python lack pidfds."""
+    try:
+        return os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return None
+
+
+def _stop_requested(control_fd, index):
+    """Read pending stop requests from the control pipe; whether one is for case `index`."""
+    requested = False
+    try:
+        data = os.read(control_fd, READ_SIZE)
+    except BlockingIOError:
+        return False
+    for offset in range(0, len(data) - HEADER.size + 1, HEADER.size):
+        requested |= HEADER.unpack_from(data, offset)[0] == index
+    return requested
+
+
+def run_case(code_obj, input_data, memory_limit_mb=None, output_limit_kb=None, on_stdout=None,
+             control_fd=None, index=None, private_fds=(), time_limit=None, on_start=None):
+    """
+    Execute a compiled submission against one input in a forked child and capture its output.
+
+    `on_stdout(chunk)` receives stdout as it arrives instead of it being
+    returned. A stop request for `index` on `control_fd` kills the child, and
+    so does running past `time_limit` seconds of wall time, with status
+    "timeout". `private_fds` are the worker's own descriptors, closed in the
+    child. `on_start(pid)` is called once the child is forked.
+    """
+    limit = output_limit_kb * 1024 if output_limit_kb else None
+    stdout = _Capture(limit, on_stdout)
+    stderr = _Capture(limit)
+    notes = []
+
+    stdin_fd = _stdin_file(input_data)
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    wall_start = time.perf_counter()
+    deadline = wall_start + time_limit if time_limit else None
+    pid = os.fork()
+    if pid == 0:
+        _run_child(code_obj, stdin_fd, stdout_w, stderr_w, memory_limit_mb,
+                   (stdout_r, stderr_r, *private_fds))
+    try:
+        # Also set in the child; whichever runs first, the group exists before it is used.
+        os.setpgid(pid, pid)
+    except OSError:
+        pass
+    for fd in (stdin_fd, stdout_w, stderr_w):
+        os.close(fd)
+    if on_start is not None:
+        on_start(pid)
+
+    streams = {stdout_r: stdout, stderr_r: stderr}
+    pidfd = _open_pidfd(pid)
+    watched = [fd for fd in (control_fd, pidfd) if fd is not None]
+    waited = None
+    stopped = requested = timed_out = False
+    while not stopped:
+        wait = POLL_INTERVAL
+        if deadline is not None:
+            wait = min(wait, deadline - time.perf_counter())
+            if wait <= 0:
+                stopped = timed_out = True
+                break
+        ready, _, _ = select.select(list(streams) + watched, [], [], wait)
+        for fd in ready:
+            if fd == control_fd:
+                if _stop_requested(control_fd, index):
+                    stopped = requested = True
+                    break
+                continue
+            if fd == pidfd:
+                continue
+            chunk = os.read(fd, READ_SIZE)
+            if not chunk:
+                del streams[fd]
+                os.close(fd)
+            elif not streams[fd].feed(chunk):
+                stopped = True
+                break
+        if stopped:
+            break
+        if not streams or not ready or pidfd in ready:
+            # Processes the child started may hold its pipes open after it
+            # exits, and the child may close them before it exits.
+            waited = os.wait4(pid, os.WNOHANG)
+            if waited[0]:
+                break
+            waited = None
+    if stopped:
+        _kill_group(pid)
+    elif waited is not None:
+        for fd, capture in streams.items():
+            _drain(fd, capture)
+    for fd in streams:
+        os.close(fd)
+    if pidfd is not None:
+        os.close(pidfd)
+    if waited is None:
+        waited = os.wait4(pid, 0)
+    wall_time = time.perf_counter() - wall_start
+    # Processes the submission started are still in the child's group.
+    reaped = _kill_group(pid)
+    _, wait_status, usage = waited
+
+    if requested:
+        status = "stopped"
+    elif timed_out:
+        status = "timeout"
+    elif stdout.exceeded or stderr.exceeded:
+        status = "output"
+        notes.append(f"\nOutput limit exceeded ({output_limit_kb} KB)\n")
+    elif os.WIFSIGNALED(wait_status):
+        # Not "error": a signal may come from the host (the OOM killer), not the code.
+        status = "killed"
+        notes.append(f"\nProcess killed by {signal.Signals(os.WTERMSIG(wait_status)).name}\n")
+    else:
+        exit_code = os.WEXITSTATUS(wait_status)
+        status = {EXIT_OK: "ok", EXIT_MEMORY: "memory"}.get(exit_code, "error")
+
+    result = {
+        "status": status,
+        "stderr": stderr.getvalue() + "".join(notes),
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+        "wall_time": wall_time,
+        # ru_maxrss is in KB on Linux and includes the pages shared with the worker.
+        "peak_memory_kb": usage.ru_maxrss,
+        "reaped": int(reaped),
+    }
+    if on_stdout is None:
+        result["stdout"] = stdout.getvalue()
+    return result
+
+
+def run_job(job, payloads, jobs, results, control_fd=None):
+    """
+    Run a submission against every input of a batch job.
+
+    One result frame is written per input as soon as that case finishes, so
+    the parent can apply a separate timeout to each case. In "step" mode the
+    worker then waits for a {"continue": bool} frame before the next case,
+    which lets fail-fast grading stop the batch early.
+    """
+    code = job["code"]
+    # Register the source so tracebacks can quote the offending lines.
+    linecache.cache[SOURCE_NAME] = (len(code), None, code.splitlines(True), SOURCE_NAME)
+    try:
+        if job.get("bytecode"):
+            code_obj = marshal.loads(payloads.pop(0))
+        else:
+            code_obj = compile(code, SOURCE_NAME, "exec")
+        compile_error = None
+    except BaseException as e:
+        code_obj = None
+        compile_error = "".join(traceback.format_exception_only(type(e), e))
+
+    private_fds = (jobs.fileno(), results.fileno()) + ((control_fd,) if control_fd is not None else ())
+    for index, input_data in enumerate(payloads):
+        if code_obj is None:
+            result = {"status": "error", "stderr": compile_error,
+                      "cpu_time": 0.0, "wall_time": 0.0, "peak_memory_kb": None}
+        else:
+            if control_fd is not None:
+                # Stop requests that arrived after the case they were meant for.
+                _stop_requested(control_fd, None)
+            forward = lambda chunk, index=index: write_frame(results, {"index": index, "stdout": True}, [chunk])
+            started = lambda pid, index=index: write_frame(results, {"index": index, "pid": pid})
+            result = run_case(code_obj, input_data, job.get("memory_limit_mb"), job.get("output_limit_kb"),
+                              forward, control_fd, index, private_fds, job.get("time_limit"), started)
+        result["index"] = index
+        write_frame(results, result)
+        if job.get("step"):
+            control, _ = read_frame(jobs)
+            if control is None or not control.get("continue"):
+                return
+
+
+def main():
+    # Keep the protocol pipes on private descriptors, closed in every child,
+    # and point fd 0/1 at /dev/null until a child replaces them.
+    jobs = os.fdopen(os.dup(0), "rb")
+    results = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    control_fd = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    if control_fd is not None:
+        os.set_blocking(control_fd, False)
+
+    scratch = os.getcwd()
+    while True:
+        job, payloads = read_frame(jobs)
+        if job is None:
+            break
+        try:
+            run_job(job, payloads, jobs, results, control_fd)
+        finally:
+            wipe_scratch(scratch)
+
+
+if __name__ == "__main__":
+    main()
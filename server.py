@@ -1,13 +1,15 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from typing import Literal, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import asyncio
+import functools
 import os
 import json
-import subprocess
-import tempfile
-import time
 import uuid
 
 # Try to import database functions, falling back gracefully if not available.
@@ -20,7 +22,16 @@ except ImportError as e:
     print(f"⚠ Warning: Database module not available - {e}")
     print("⚠ Authentication will not work.")
 
-from grader import grade_submission
+from grader import grade_submission, run_cases, problem_limits, output_limit, time_exceeded, memory_exceeded
+from precompile import InvalidSubmission
+from checkers import check
+from result_cache import get_cache
+from problem_registry import get_registry
+from worker_pool import get_pool, start_pool, stop_pool
+from submission_jobs import SubmissionQueue, QueueFull
+from case_stats import save_stats
+from submission_store import SubmissionStore, LOG_FILE
+from sqlite_store import SqliteSubmissionStore
 
 app = FastAPI()
 
@@ -35,13 +46,28 @@ app.add_middleware(
 
 print("✓ CORS middleware configured")
 
-# Load existing submissions from a JSON file.
+# Grading blocks on sandbox worker pipes, so it runs on a dedicated bounded
+# executor instead of the event loop. The semaphore caps concurrent gradings
+# at the CPU count so cheap endpoints stay responsive during bursts.
+GRADING_CONCURRENCY = int(os.environ.get("GRADING_CONCURRENCY", os.cpu_count() or 2))
+grading_executor = ThreadPoolExecutor(max_workers=GRADING_CONCURRENCY, thread_name_prefix="grading")
+grading_semaphore = asyncio.Semaphore(GRADING_CONCURRENCY)
+
+async def run_grading(func, *args, **kwargs):
+    """Run a blocking grading call off the event loop."""
+    async with grading_semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(grading_executor, functools.partial(func, *args, **kwargs))
+
+# Load existing submissions from the snapshot and replay the log written since.
+# With LEADERBOARD_BACKEND=sqlite they live in a database shared by all server
+# processes instead, and the snapshot and log are only imported once.
 leaderboard_file = "leaderboard.json"
-if os.path.exists(leaderboard_file):
-    with open(leaderboard_file, "r") as f:
-        submissions = json.load(f)
+if os.environ.get("LEADERBOARD_BACKEND", "memory") == "sqlite":
+    submissions = SqliteSubmissionStore(snapshot_path=leaderboard_file, log_path=LOG_FILE)
 else:
-    submissions = []
+    submissions = SubmissionStore(leaderboard_file, LOG_FILE)
+submissions.load()
 
 # Initialize the database on application startup.
 @app.on_event("startup")
@@ -55,12 +81,37 @@ async def startup():
             print(f"✗ Database initialization failed: {e}")
     else:
         print("⚠ Running without database support")
+    problems = get_registry().load_all()["problems"]
+    print(f"✓ Loaded {len(problems)} problems")
+    try:
+        start_pool()
+        print(f"✓ Grading worker pool started ({get_pool().size} workers)")
+    except Exception as e:
+        print(f"✗ Grading worker pool failed to start: {e}")
+    await submission_queue.start()
+    print(f"✓ Submission queue started ({submission_queue.workers} graders)")
+    submissions.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await submission_queue.stop()
+    stop_pool()
+    print("✓ Grading worker pool stopped")
+    save_stats()
+    try:
+        # Drains the write-behind queue, which may wait on the database lock.
+        await asyncio.to_thread(submissions.close)
+    except OSError as e:
+        print(f"Warning: Failed to compact leaderboard log: {e}")
 
 # --- Pydantic Models for API Request Body Validation ---
 class Submission(BaseModel):
     user_id: str
     problem_id: str
     code: str
+    # Stop at the first failing test (True) or the first timeout ("timeout");
+    # None uses the problem's own setting.
+    fail_fast: Optional[Union[bool, Literal["timeout"]]] = None
 
 class SignupRequest(BaseModel):
     username: str
@@ -112,56 +163,23 @@ async def login_api(request: LoginRequest):
 @app.get("/api/problems")
 def list_problems_api():
     """List all available problems from test cases."""
-    problems = []
-    test_cases_dir = "test_cases"
-    if not os.path.exists(test_cases_dir):
-        return {"problems": []}
-    for file in os.listdir(test_cases_dir):
-        if file.endswith(".json"):
-            try:
-                with open(os.path.join(test_cases_dir, file), "r") as f:
-                    data = json.load(f)
-                if "public_tests" in data or "hidden_tests" in data:
-                    problems.append(file.replace(".json", ""))
-            except Exception:
-                continue
-    return {"problems": problems}
+    return get_registry().list_payload()
 
 @app.get("/api/problem/{problem_id}")
 def get_problem_details_api(problem_id: str):
     """Get detailed information about a specific problem."""
     try:
-        test_case_path = os.path.join("test_cases", f"{problem_id}.json")
-        if not os.path.exists(test_case_path):
-            raise HTTPException(status_code=404, detail="Problem not found")
-        with open(test_case_path, "r") as f:
-            problem_data = json.load(f)
-        return {
-            "problem_id": problem_id,
-            "public_tests": problem_data.get("public_tests", []),
-            "hidden_tests_count": len(problem_data.get("hidden_tests", [])),
-            "total_tests": len(problem_data.get("public_tests", [])) + len(problem_data.get("hidden_tests", []))
-        }
+        problem = get_registry().get(problem_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading problem: {str(e)}")
+    if problem is None:
+        raise HTTPException(status_code=404, detail="Problem not found")
+    return problem.details
 
-@app.post("/api/submit")
-async def submit_code_api(submission: Submission):
-    """Submit code for grading and update leaderboard."""
-    test_case_path = os.path.join("test_cases", f"{submission.problem_id}.json")
-    if not os.path.exists(test_case_path):
-        raise HTTPException(status_code=404, detail="Problem test cases not found")
-    try:
-        result = grade_submission(
-            code=submission.code,
-            problem_id=submission.problem_id,
-            user_id=submission.user_id
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Grading failed: {str(e)}")
-
+def record_submission(submission: Submission, result: dict, submission_id: str = None) -> dict:
+    """Build the leaderboard entry for a graded submission and keep it if it is the user's best."""
     submission_entry = {
-        "submission_id": str(uuid.uuid4()),
+        "submission_id": submission_id or str(uuid.uuid4()),
         "user_id": submission.user_id,
         "problem_id": submission.problem_id,
         "score": result["score"],
@@ -170,36 +188,112 @@ async def submit_code_api(submission: Submission):
         "execution_time": result.get("execution_time", 0.0),
         "error_details": result.get("error_details", [])
     }
-    global submissions
-    existing_index = next((i for i, entry in enumerate(submissions)
-                           if entry["user_id"] == submission.user_id and entry["problem_id"] == submission.problem_id), None)
-    if existing_index is not None:
-        # Update if score is better, or if score is same but time is better
-        existing_submission = submissions[existing_index]
-        should_update = (
-            submission_entry["score"] > existing_submission["score"] or
-            (submission_entry["score"] == existing_submission["score"] and 
-             submission_entry["execution_time"] < existing_submission.get("execution_time", float('inf')))
-        )
-        if should_update:
-            submissions[existing_index] = submission_entry
-    else:
-        submissions.append(submission_entry)
+    # Kept if the score is better, or if the score is the same but the time is better
     try:
-        with open(leaderboard_file, "w") as f:
-            json.dump(submissions, f, indent=2, default=str)
+        submissions.record(submission_entry)
     except Exception as e:
         print(f"Warning: Failed to save leaderboard: {e}")
+    return submission_entry
+
+def grade_response(result: dict, submission_entry: dict) -> dict:
     return {
         "grade": {
             "score": result["score"],
             "total": result["total"],
             "replay_result": result["replay_result"],
-            "error_details": result.get("error_details", [])[:3]
+            "error_details": result.get("error_details", [])[:3],
+            "skipped": result.get("skipped", 0),
+            "execution_time": result.get("execution_time", 0.0),
+            "metrics": result.get("metrics")
         },
         "leaderboard_entry": submission_entry
     }
 
+async def grade_queued_submission(job: dict, on_test_result) -> dict:
+    """Grade a submission taken from the background queue."""
+    submission = Submission(**job["payload"])
+    result = await run_grading(
+        grade_submission,
+        code=submission.code,
+        problem_id=submission.problem_id,
+        user_id=submission.user_id,
+        on_test_result=on_test_result,
+        fail_fast=submission.fail_fast
+    )
+    submission_entry = record_submission(submission, result, submission_id=job["submission_id"])
+    return grade_response(result, submission_entry)
+
+submission_queue = SubmissionQueue(grade_queued_submission, workers=GRADING_CONCURRENCY)
+
+@app.post("/api/submit")
+async def submit_code_api(submission: Submission, background: bool = False):
+    """
+    Submit code for grading and update leaderboard.
+
+    With `?background=true` the submission is queued and `202 Accepted` is
+    returned immediately with a `submission_id` to poll or stream.
+    """
+    if get_registry().get(submission.problem_id) is None:
+        raise HTTPException(status_code=404, detail="Problem test cases not found")
+    if background:
+        try:
+            job = submission_queue.submit(submission.model_dump())
+        except QueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        submission_id = job["submission_id"]
+        return JSONResponse(status_code=202, content={
+            "submission_id": submission_id,
+            "status": job["status"],
+            "status_url": f"/api/submissions/{submission_id}",
+            "events_url": f"/api/submissions/{submission_id}/events"
+        })
+    try:
+        result = await run_grading(
+            grade_submission,
+            code=submission.code,
+            problem_id=submission.problem_id,
+            user_id=submission.user_id,
+            fail_fast=submission.fail_fast
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Grading failed: {str(e)}")
+
+    submission_entry = record_submission(submission, result)
+    return grade_response(result, submission_entry)
+
+@app.get("/api/submissions/{submission_id}")
+async def get_submission_status_api(submission_id: str):
+    """Poll the status of a background submission."""
+    job = submission_queue.get(submission_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    return SubmissionQueue.describe(job)
+
+@app.get("/api/submissions/{submission_id}/events")
+async def stream_submission_events_api(submission_id: str):
+    """Stream per-test results of a background submission as Server-Sent Events."""
+    job = submission_queue.get(submission_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+
+    async def event_stream():
+        async for event, data in submission_queue.events(job):
+            yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/grader/stats")
+async def grader_stats_api():
+    """Worker pool, cache, queue and leaderboard writer counters for monitoring."""
+    cache = get_cache()
+    return {
+        "pool": get_pool().stats(),
+        "cache": cache.stats() if cache is not None else None,
+        "queue": {"pending": submission_queue.pending()},
+        "leaderboard": submissions.stats()
+    }
+
 # @app.post("/api/run")
 # async def run_code_api(request: dict):
 #     """Run code without grading."""
@@ -274,72 +368,98 @@ async def run_code_api(request: dict):
             return {"success": False, "error": "Missing problem_id or code"}
         
         # Load test cases
-        test_case_path = os.path.join("test_cases", f"{problem_id}.json")
+        problem = get_registry().get(problem_id)
         
-        if not os.path.exists(test_case_path):
+        if problem is None:
             return {"success": False, "error": "Test cases not found"}
         
-        with open(test_case_path, "r") as f:
-            test_data = json.load(f)
+        test_data = problem.data
         
         # Get all public test cases (limit to 4)
-        public_tests = test_data.get("public_tests", [])[:4]
+        public_tests = problem.public_tests[:4]
         
         if not public_tests:
             return {"success": False, "error": "No public test cases available"}
         
         # Run code against all public test cases
         results = []
+        time_limit, memory_limit_mb = problem_limits(test_data)
+        checker = test_data.get("checker")
         
-        for idx, test_case in enumerate(public_tests):
-            test_input = test_case.get("input", "")
+        # Run the code against every public test in one sandbox worker,
+        # reusing cached results shared with /api/submit
+        try:
+            batch_results = await run_grading(
+                run_cases,
+                code,
+                problem_id,
+                problem.inputs[:len(public_tests)],
+                problem.expected_outputs[:len(public_tests)],
+                time_limit=time_limit,
+                memory_limit_mb=memory_limit_mb,
+                output_limit_kb=output_limit(test_data),
+                checker=checker,
+                case_digests=problem.case_digests[:len(public_tests)],
+                # The run panel shows the whole output, not just up to the first mismatch
+                stop_on_mismatch=False
+            )
+        except InvalidSubmission as e:
+            return {"success": False, "error": f"Compilation error - {e}"}
+        
+        for idx, (test_case, result) in enumerate(zip(public_tests, batch_results)):
+            # Show the input the code actually read, after the problem's input_transform
+            test_input = problem.inputs[idx]
+            if not isinstance(test_input, str):
+                test_input = bytes(test_input).decode("utf-8", errors="replace")
             expected_output = test_case.get("expected_output", "").strip()
             
-            tmp_file = None
             try:
-                # Create temporary file with the code
-                with tempfile.NamedTemporaryFile(mode='w+', suffix='.py', delete=False) as tmp:
-                    tmp_file = tmp.name
-                    tmp.write(code + "\n")
-                    tmp.write(f"""
-if __name__ == "__main__":
-    import sys
-    from io import StringIO
-    
-    input_data = '''{test_input}'''
-    sys.stdin = StringIO(input_data)
-    
-    solve()
-""")
-                    tmp.flush()
-                
-                # Run the code
-                start_time = time.time()
-                result = subprocess.run(
-                    ["python", tmp_file],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                execution_time = round(time.time() - start_time, 3)
+                execution_time = round(result["wall_time"], 3)
+                cpu_time = round(result.get("cpu_time") or 0.0, 3)
                 
                 # Check if execution was successful
-                if result.returncode != 0:
+                if time_exceeded(result, time_limit):
+                    results.append({
+                        "test_number": idx + 1,
+                        "success": False,
+                        "error": f"Execution timeout ({time_limit:g} seconds)",
+                        "input": test_input,
+                        "expected_output": expected_output,
+                        "actual_output": None,
+                        "execution_time": float(time_limit),
+                        "passed": False
+                    })
+                elif memory_exceeded(result, memory_limit_mb):
                     results.append({
                         "test_number": idx + 1,
                         "success": False,
-                        "error": result.stderr or "Runtime error occurred",
+                        "error": f"Memory limit exceeded ({memory_limit_mb} MB)",
                         "input": test_input,
                         "expected_output": expected_output,
                         "actual_output": None,
                         "execution_time": execution_time,
+                        "cpu_time": cpu_time,
+                        "peak_memory_kb": result.get("peak_memory_kb"),
+                        "passed": False
+                    })
+                elif result["status"] not in ("ok", "wrong"):
+                    results.append({
+                        "test_number": idx + 1,
+                        "success": False,
+                        "error": result["stderr"] or "Runtime error occurred",
+                        "input": test_input,
+                        "expected_output": expected_output,
+                        "actual_output": None,
+                        "execution_time": execution_time,
+                        "cpu_time": cpu_time,
+                        "peak_memory_kb": result.get("peak_memory_kb"),
                         "passed": False
                     })
                 else:
-                    actual_output = result.stdout.strip()
+                    actual_output = result["stdout"].strip()
                     
-                    # Check if output matches expected
-                    passed = actual_output.replace(" ", "") == expected_output.replace(" ", "")
+                    # Check the output with the problem's checker, as /api/submit does
+                    passed = check(checker, result["stdout"], test_case.get("expected_output", ""))
                     
                     results.append({
                         "test_number": idx + 1,
@@ -348,20 +468,11 @@ if __name__ == "__main__":
                         "expected_output": expected_output,
                         "actual_output": actual_output,
                         "execution_time": execution_time,
+                        "cpu_time": cpu_time,
+                        "peak_memory_kb": result.get("peak_memory_kb"),
                         "passed": passed
                     })
                     
-            except subprocess.TimeoutExpired:
-                results.append({
-                    "test_number": idx + 1,
-                    "success": False,
-                    "error": "Execution timeout (5 seconds)",
-                    "input": test_input,
-                    "expected_output": expected_output,
-                    "actual_output": None,
-                    "execution_time": 5.0,
-                    "passed": False
-                })
             except Exception as e:
                 results.append({
                     "test_number": idx + 1,
@@ -373,13 +484,6 @@ if __name__ == "__main__":
                     "execution_time": 0,
                     "passed": False
                 })
-            finally:
-                # Clean up temporary file
-                if tmp_file and os.path.exists(tmp_file):
-                    try:
-                        os.unlink(tmp_file)
-                    except:
-                        pass
         
         # Calculate summary
         passed_count = sum(1 for r in results if r.get("passed", False))
@@ -401,32 +505,8 @@ if __name__ == "__main__":
 @app.get("/api/leaderboard")
 async def get_leaderboard_api():
     """Get the leaderboard."""
-    if not submissions:
-        return {"leaderboard": []}
-    problems = {}
-    for entry in submissions:
-        pid = entry.get("problem_id", "unknown")
-        if pid not in problems:
-            problems[pid] = []
-        problems[pid].append(entry)
-    leaderboard = []
-    for problem_id, entries in problems.items():
-        sorted_entries = sorted(entries, key=lambda x: (-x["score"], x.get("execution_time", float('inf')), x["timestamp"]))
-        seen_users = set()
-        for entry in sorted_entries:
-            uid = entry["user_id"]
-            if uid not in seen_users:
-                leaderboard.append({
-                    "user_id": uid,
-                    "problem_id": problem_id,
-                    "score": entry["score"],
-                    "replay_result": entry["replay_result"],
-                    "timestamp": entry["timestamp"],
-                    "execution_time": entry.get("execution_time", 0.0)
-                })
-                seen_users.add(uid)
-    leaderboard.sort(key=lambda x: (-x["score"], x.get("execution_time", float('inf')), x["timestamp"]))
-    return {"leaderboard": leaderboard}
+    # The SQLite backend queries the database; keep that off the event loop.
+    return {"leaderboard": await asyncio.to_thread(submissions.leaderboard)}
 
 # --- Serve Static Frontend Files ---
 # This MUST be the last route defined to act as a fallback for all non-API paths.
@@ -0,0 +1,196 @@
+"""
+Leaderboard store backed by SQLite, shared by every server process.
+
+The in-memory SubmissionStore lives inside one process, so with
+`uvicorn --workers N` each worker would keep its own leaderboard and
+overwrite the others' leaderboard.json. With LEADERBOARD_BACKEND=sqlite the
+entries live in one SQLite database in WAL mode instead: readers never block
+the writer, and every worker ranks the same rows.
+
+The table has one row per (user_id, problem_id), which is its primary key
+and also serves lookups by user. Recording a submission is a single
+INSERT ... ON CONFLICT DO UPDATE that only replaces a row with a better
+entry, so concurrent workers cannot lose each other's updates. Per-problem
+rankings read the (problem_id, score, execution_time) index in order.
+
+Writes can wait up to 30 seconds for another process's lock, so record()
+only queues the entry: a WriteBehind thread upserts each batch in one
+transaction on its own connection. Reads use a second connection and, like
+close(), are called off the event loop.
+
+Each process caches the /api/leaderboard rows and rebuilds them only when
+the database changed, which `PRAGMA data_version` reports for commits made
+through the other connection and by other processes.
+
+On first start with an empty database, the existing leaderboard.json
+snapshot and leaderboard.log are imported.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+from submission_store import (BATCH_SIZE, FLUSH_INTERVAL, SubmissionStore, WriteBehind,
+                              leaderboard_row)
+
+DB_FILE = os.environ.get("LEADERBOARD_DB", "leaderboard.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    user_id TEXT NOT NULL,
+    problem_id TEXT NOT NULL,
+    submission_id TEXT,
+    score INTEGER NOT NULL,
+    replay_result TEXT,
+    timestamp TEXT NOT NULL,
+    execution_time REAL NOT NULL DEFAULT 0,
+    error_details TEXT,
+    PRIMARY KEY (user_id, problem_id)
+);
+CREATE INDEX IF NOT EXISTS submissions_problem_rank ON submissions (problem_id, score DESC, execution_time);
+CREATE INDEX IF NOT EXISTS submissions_rank ON submissions (score DESC, execution_time, timestamp);
+"""
+
+COLUMNS = ("submission_id", "user_id", "problem_id", "score", "replay_result",
+           "timestamp", "execution_time", "error_details")
+
+RANK_ORDER = "score DESC, execution_time, timestamp, user_id, problem_id"
+
+UPSERT = f"""
+INSERT INTO submissions ({", ".join(COLUMNS)}) VALUES ({", ".join("?" for _ in COLUMNS)})
+ON CONFLICT (user_id, problem_id) DO UPDATE SET
+    {", ".join(f"{column} = excluded.{column}" for column in COLUMNS if column not in ("user_id", "problem_id"))}
+WHERE excluded.score > submissions.score
+   OR (excluded.score = submissions.score AND excluded.execution_time < submissions.execution_time)
+"""
+
+
+def _row(entry: dict) -> tuple:
+    values = dict(entry, execution_time=entry.get("execution_time", 0.0),
+                  error_details=json.dumps(entry.get("error_details", []), default=str))
+    return tuple(values.get(column) for column in COLUMNS)
+
+
+def _entry(row: sqlite3.Row) -> dict:
+    entry = {column: row[column] for column in COLUMNS}
+    entry["error_details"] = json.loads(entry["error_details"]) if entry["error_details"] else []
+    return entry
+
+
+class SqliteSubmissionStore:
+    """The SubmissionStore interface over a SQLite database shared between processes."""
+
+    def __init__(self, db_path: str = DB_FILE, snapshot_path: str = None, log_path: str = None,
+                 flush_interval: float = FLUSH_INTERVAL, batch_size: int = BATCH_SIZE):
+        self.db_path = db_path
+        # The JSON snapshot and log imported into an empty database.
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path
+        self._write_conn = self._connect()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            self._write_conn.execute("PRAGMA journal_mode=WAL")
+            self._write_conn.executescript(SCHEMA)
+        self._conn = self._connect()
+        self._lock = threading.Lock()
+        # Cached /api/leaderboard rows and the database version they were built from.
+        self._leaderboard = []
+        self._leaderboard_version = None
+        self._writer = WriteBehind(self._upsert_many, "leaderboard-writer", flush_interval, batch_size)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # WAL with synchronous=NORMAL stays consistent after a crash; only
+        # the last commits before a power loss can be lost.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def load(self):
+        """Import the JSON snapshot and log if the database is still empty."""
+        if len(self) or not self.snapshot_path:
+            return
+        legacy = SubmissionStore(self.snapshot_path, self.log_path)
+        legacy.load()
+        entries = legacy.export()
+        if entries:
+            self._upsert_many(entries)
+            print(f"✓ Imported {len(entries)} leaderboard entries into {self.db_path}")
+
+    def record(self, entry: dict):
+        """
+        Keep `entry` if it is the user's first or best for its problem.
+
+        While the writer runs the entry is only queued and None is returned;
+        otherwise it is written at once and the result says whether it was kept.
+        """
+        if self._writer.put(entry):
+            return None
+        return self.upsert(entry)
+
+    def upsert(self, entry: dict) -> bool:
+        with self._write_lock:
+            return self._write_conn.execute(UPSERT, _row(entry)).rowcount > 0
+
+    def _upsert_many(self, entries: list):
+        """Upsert `entries` in one transaction."""
+        with self._write_lock:
+            with self._write_conn:
+                self._write_conn.execute("BEGIN IMMEDIATE")
+                self._write_conn.executemany(UPSERT, [_row(entry) for entry in entries])
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get(self, user_id: str, problem_id: str):
+        rows = self._query("SELECT * FROM submissions WHERE user_id = ? AND problem_id = ?", (user_id, problem_id))
+        return _entry(rows[0]) if rows else None
+
+    def for_problem(self, problem_id: str) -> list:
+        return [_entry(row) for row in self._query("SELECT * FROM submissions WHERE problem_id = ?", (problem_id,))]
+
+    def for_user(self, user_id: str) -> list:
+        return [_entry(row) for row in self._query("SELECT * FROM submissions WHERE user_id = ?", (user_id,))]
+
+    def ranking(self, problem_id: str, limit: int = None) -> list:
+        rows = self._query(f"SELECT * FROM submissions WHERE problem_id = ? ORDER BY {RANK_ORDER} LIMIT ?",
+                           (problem_id, -1 if limit is None else limit))
+        return [_entry(row) for row in rows]
+
+    def leaderboard(self) -> list:
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._leaderboard_version:
+                rows = self._conn.execute(f"SELECT * FROM submissions ORDER BY {RANK_ORDER}").fetchall()
+                self._leaderboard = [leaderboard_row(_entry(row)) for row in rows]
+                self._leaderboard_version = version
+            return list(self._leaderboard)
+
+    def problem_ids(self) -> list:
+        return [row[0] for row in self._query("SELECT DISTINCT problem_id FROM submissions")]
+
+    def export(self) -> list:
+        return [_entry(row) for row in self._query("SELECT * FROM submissions ORDER BY rowid")]
+
+    def start(self):
+        """Start the write-behind thread."""
+        self._writer.start()
+
+    def stop(self):
+        """Stop the write-behind thread after it has written everything queued."""
+        self._writer.stop()
+
+    def stats(self) -> dict:
+        """Write-behind queue counters; no database query, so it is safe on the event loop."""
+        return dict(self._writer.stats(), backend="sqlite")
+
+    def close(self):
+        self.stop()
+        with self._write_lock:
+            self._write_conn.close()
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM submissions")[0][0]
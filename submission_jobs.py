@@ -0,0 +1,145 @@
+"""
+Background grading queue for /api/submit.
+
+A queued submission gets a `submission_id` right away and is graded by one of
+a fixed number of background tasks. Clients can poll the job or follow it as
+a stream of events: one "test" event per finished test case and a final
+"result" (or "error") event.
+"""
+import asyncio
+import os
+import uuid
+from collections import deque
+from datetime import datetime
+
+MAX_PENDING_JOBS = int(os.environ.get("GRADING_QUEUE_SIZE", 1000))
+MAX_FINISHED_JOBS = int(os.environ.get("GRADING_JOBS_RETAINED", 1000))
+
+
+class QueueFull(Exception):
+    """Raised when too many submissions are already waiting to be graded."""
+
+
+class SubmissionQueue:
+    """
+    In-process job queue. `handler(job, on_test_result)` is an async callable
+    that grades `job["payload"]` and returns the response body; it may call
+    `on_test_result(event)` from any thread.
+    """
+
+    def __init__(self, handler, workers: int, max_pending=MAX_PENDING_JOBS, max_finished=MAX_FINISHED_JOBS):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self._queue = None
+        self._tasks = []
+        self._jobs = {}
+        self._finished = deque()
+        self._loop = None
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, payload: dict) -> dict:
+        """Queue `payload` for grading and return the new job."""
+        if self._queue is None:
+            raise RuntimeError("Submission queue is not running")
+        job = {
+            "submission_id": str(uuid.uuid4()),
+            "status": "queued",
+            "payload": payload,
+            "created_at": datetime.now().isoformat(),
+            "tests": [],
+            "result": None,
+            "error": None,
+            "_wakeup": asyncio.Event(),
+        }
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull("Grading queue is full, try again shortly")
+        self._jobs[job["submission_id"]] = job
+        return job
+
+    def get(self, submission_id: str):
+        return self._jobs.get(submission_id)
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @staticmethod
+    def describe(job: dict) -> dict:
+        """Public view of a job for the polling endpoint."""
+        return {
+            "submission_id": job["submission_id"],
+            "status": job["status"],
+            "user_id": job["payload"].get("user_id"),
+            "problem_id": job["payload"].get("problem_id"),
+            "created_at": job["created_at"],
+            "tests": list(job["tests"]),
+            "result": job["result"],
+            "error": job["error"],
+        }
+
+    async def events(self, job: dict):
+        """Yield (event, data) pairs for `job`, replaying those already sent."""
+        sent = 0
+        while True:
+            wakeup = job["_wakeup"]
+            while sent < len(job["tests"]):
+                yield "test", job["tests"][sent]
+                sent += 1
+            if job["status"] == "completed":
+                yield "result", job["result"]
+                return
+            if job["status"] == "failed":
+                yield "error", {"detail": job["error"]}
+                return
+            await wakeup.wait()
+
+    def _notify(self, job):
+        wakeup, job["_wakeup"] = job["_wakeup"], asyncio.Event()
+        wakeup.set()
+
+    def _add_test_result(self, job, event):
+        job["tests"].append(event)
+        self._notify(job)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job["status"] = "running"
+            self._notify(job)
+
+            def on_test_result(event, job=job):
+                self._loop.call_soon_threadsafe(self._add_test_result, job, event)
+
+            try:
+                job["result"] = await self.handler(job, on_test_result)
+                job["status"] = "completed"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job["error"] = str(e)
+                job["status"] = "failed"
+            finally:
+                self._queue.task_done()
+            self._notify(job)
+            self._retire(job)
+
+    def _retire(self, job):
+        # Keep the most recent finished jobs around for polling.
+        self._finished.append(job["submission_id"])
+        while len(self._finished) > self.max_finished:
+            self._jobs.pop(self._finished.popleft(), None)
@@ -0,0 +1,409 @@
+"""
+In-memory store of each user's best submission per problem.
+
+Entries are kept in a dict keyed by (user_id, problem_id), with secondary
+indexes by problem and by user, so recording a submission or looking one up
+never scans the whole history. `export()` produces the list that
+leaderboard.json has always held, in the order the entries were first seen.
+
+The rankings are maintained as entries arrive: every problem has a sorted
+list of rank keys, and so does the whole leaderboard, updated with bisect
+when a user's best entry changes. The /api/leaderboard rows are kept in a
+list parallel to the global ranking, so a GET only copies it.
+
+Persistence is an append-only log: every accepted entry is appended to
+leaderboard.log as one JSON line. Once the log holds LEADERBOARD_COMPACT_EVERY
+records, a background thread writes the whole store to leaderboard.json
+(a temporary file renamed into place) and starts a new log. At startup the
+snapshot is loaded and the log replayed on top of it; replaying a record
+twice is harmless because only a better entry ever replaces one.
+
+Once start() is called, appends are write-behind: record() only updates the
+store and queues the entry, and a writer thread drains the queue in batches
+of up to LEADERBOARD_BATCH_SIZE, waiting up to LEADERBOARD_FLUSH_INTERVAL_MS
+for a batch to fill, with one fsync per batch. stop() writes out whatever is
+still queued. Entries queued when the process dies are lost from the log.
+"""
+import bisect
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+LOG_FILE = os.environ.get("LEADERBOARD_LOG", "leaderboard.log")
+COMPACT_EVERY = int(os.environ.get("LEADERBOARD_COMPACT_EVERY", 1000))
+FLUSH_INTERVAL = float(os.environ.get("LEADERBOARD_FLUSH_INTERVAL_MS", 50)) / 1000
+BATCH_SIZE = int(os.environ.get("LEADERBOARD_BATCH_SIZE", 500))
+
+
+def is_better(entry: dict, existing: dict) -> bool:
+    """Whether `entry` replaces `existing`: a higher score, or the same score in less time."""
+    if entry["score"] != existing["score"]:
+        return entry["score"] > existing["score"]
+    return entry.get("execution_time", float('inf')) < existing.get("execution_time", float('inf'))
+
+
+def rank_key(entry: dict) -> tuple:
+    """Highest score first, then fastest, then earliest; the ids make every key unique."""
+    return (-entry["score"], entry.get("execution_time", float('inf')), entry["timestamp"],
+            entry["user_id"], entry["problem_id"])
+
+
+def leaderboard_row(entry: dict) -> dict:
+    return {
+        "user_id": entry["user_id"],
+        "problem_id": entry["problem_id"],
+        "score": entry["score"],
+        "replay_result": entry["replay_result"],
+        "timestamp": entry["timestamp"],
+        "execution_time": entry.get("execution_time", 0.0)
+    }
+
+
+class WriteBehind:
+    """
+    A background thread that hands queued items to `write_batch(items)`.
+
+    The thread takes up to `batch_size` items at a time, waiting up to
+    `flush_interval` seconds for a batch to fill, so a burst of records
+    becomes a few large writes. put() returns False when the thread is not
+    running, and the caller then writes the item itself.
+    """
+
+    def __init__(self, write_batch, name: str, flush_interval: float = FLUSH_INTERVAL, batch_size: int = BATCH_SIZE):
+        self.write_batch = write_batch
+        self.name = name
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # (time queued, item); None stops the thread.
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.records_written = 0
+        self.last_batch_size = 0
+        self.max_lag = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the thread after it has written everything queued."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(None)
+        thread.join()
+
+    def put(self, item) -> bool:
+        with self._lock:
+            if self._thread is None:
+                return False
+            self._queue.put((time.monotonic(), item))
+            return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self.write_batch([item for _, item in batch])
+                self.batches += 1
+                self.records_written += len(batch)
+                self.last_batch_size = len(batch)
+            except Exception as e:
+                print(f"Warning: {self.name} failed to write {len(batch)} records: {e}")
+            self.max_lag = max(self.max_lag, time.monotonic() - batch[0][0])
+            if stopping:
+                return
+
+    def stats(self) -> dict:
+        """Queue length and lag for monitoring."""
+        with self._queue.mutex:
+            oldest = self._queue.queue[0] if self._queue.queue else None
+            pending = len(self._queue.queue)
+        lag = time.monotonic() - oldest[0] if oldest else 0.0
+        return {
+            "pending": pending,
+            "lag_ms": round(lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "batches": self.batches,
+            "records_written": self.records_written,
+            "last_batch_size": self.last_batch_size
+        }
+
+
+def _remove(ranking: list, key: tuple):
+    """Remove `key` from a sorted ranking; return the index it was at, or None."""
+    index = bisect.bisect_left(ranking, key)
+    if index < len(ranking) and ranking[index] == key:
+        del ranking[index]
+        return index
+    return None
+
+
+class SubmissionStore:
+    def __init__(self, path: str = None, log_path: str = None,
+                 flush_interval: float = FLUSH_INTERVAL, batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.log_path = log_path
+        self._entries = {}
+        # problem_id -> {user_id: entry} and user_id -> {problem_id: entry}
+        self._by_problem = {}
+        self._by_user = {}
+        # Sorted rank keys per problem and overall.
+        self._rankings = {}
+        self._ranking = []
+        # The /api/leaderboard rows, in the order of self._ranking.
+        self._leaderboard = []
+        self._lock = threading.Lock()
+        # Guards the log file, its record count and the start of a compaction.
+        self._log_lock = threading.Lock()
+        self._log = None
+        self._log_records = 0
+        self._compacting = False
+        # Serializes compactions, so an older snapshot never replaces a newer one.
+        self._compact_lock = threading.Lock()
+        self.compactions = 0
+        self._writer = WriteBehind(self._append, "leaderboard-writer", flush_interval, batch_size)
+
+    def _compacting_path(self):
+        # The log being folded into a snapshot; replayed if the server stopped before it finished.
+        return self.log_path + ".compacting"
+
+    def load(self):
+        """Read the snapshot saved in `path` and replay the log; missing files are empty."""
+        entries = []
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        if self.log_path:
+            entries.extend(self._read_log(self._compacting_path()))
+            records = self._read_log(self.log_path, repair=True)
+            entries.extend(records)
+            self._log_records = len(records)
+        self.replace_all(entries)
+
+    @staticmethod
+    def _read_log(path, repair: bool = False):
+        """The records in a log. A last line cut short by a crash is skipped, and with `repair` truncated away."""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        end = data.rfind(b"\n") + 1
+        if repair and end < len(data):
+            os.truncate(path, end)
+        records = []
+        for line in data[:end].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+    def replace_all(self, entries):
+        """Reset the store to the best of `entries`, ranking them with one sort instead of one insert each."""
+        best = {}
+        for entry in entries:
+            key = (entry["user_id"], entry["problem_id"])
+            existing = best.get(key)
+            if existing is None or is_better(entry, existing):
+                best[key] = entry
+        with self._lock:
+            self._entries = best
+            self._by_problem, self._by_user, self._rankings = {}, {}, {}
+            for entry in best.values():
+                self._by_problem.setdefault(entry["problem_id"], {})[entry["user_id"]] = entry
+                self._by_user.setdefault(entry["user_id"], {})[entry["problem_id"]] = entry
+                self._rankings.setdefault(entry["problem_id"], []).append(rank_key(entry))
+            for ranking in self._rankings.values():
+                ranking.sort()
+            self._ranking = sorted(key for ranking in self._rankings.values() for key in ranking)
+            self._leaderboard = [leaderboard_row(best[key[-2:]]) for key in self._ranking]
+
+    def upsert(self, entry: dict) -> bool:
+        """Keep `entry` if it is the user's first or best for its problem; return whether it was kept."""
+        key = (entry["user_id"], entry["problem_id"])
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None and not is_better(entry, existing):
+                return False
+            self._entries[key] = entry
+            ranking = self._rankings.setdefault(entry["problem_id"], [])
+            if existing is not None:
+                _remove(ranking, rank_key(existing))
+                index = _remove(self._ranking, rank_key(existing))
+                if index is not None:
+                    del self._leaderboard[index]
+            new_key = rank_key(entry)
+            bisect.insort(ranking, new_key)
+            index = bisect.bisect_left(self._ranking, new_key)
+            self._ranking.insert(index, new_key)
+            self._leaderboard.insert(index, leaderboard_row(entry))
+            self._by_problem.setdefault(entry["problem_id"], {})[entry["user_id"]] = entry
+            self._by_user.setdefault(entry["user_id"], {})[entry["problem_id"]] = entry
+            return True
+
+    def record(self, entry: dict) -> bool:
+        """Upsert `entry` and log it if it was kept; return whether it was kept."""
+        if not self.upsert(entry):
+            return False
+        if self.log_path and not self._writer.put(entry):
+            self._append([entry])
+        return True
+
+    def start(self):
+        """Start the write-behind thread."""
+        if self.log_path:
+            self._writer.start()
+
+    def stop(self):
+        """Stop the write-behind thread after it has written everything queued."""
+        self._writer.stop()
+
+    def stats(self) -> dict:
+        """Write-behind queue and log counters for monitoring."""
+        return dict(self._writer.stats(), entries=len(self), log_records=self._log_records,
+                    compactions=self.compactions)
+
+    def _append(self, entries: list):
+        """Append `entries` to the log with a single write and fsync."""
+        data = "".join(json.dumps(entry, default=str) + "\n" for entry in entries)
+        with self._log_lock:
+            if self._log is None:
+                self._log = open(self.log_path, "a")
+            self._log.write(data)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log_records += len(entries)
+            start_compaction = self._log_records >= COMPACT_EVERY and not self._compacting
+            if start_compaction:
+                self._compacting = True
+        if start_compaction:
+            threading.Thread(target=self._compact_in_background, name="leaderboard-compaction", daemon=True).start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except OSError as e:
+            print(f"Warning: Failed to compact leaderboard log: {e}")
+
+    def compact(self):
+        """Write the whole store to the snapshot and drop the log records it now contains."""
+        with self._compact_lock:
+            self._compact()
+
+    def _compact(self):
+        with self._log_lock:
+            self._compacting = True
+            # Taken under the log lock, so every record in the log is already in the store.
+            entries = self.export()
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            # A leftover .compacting file means an earlier compaction failed; this
+            # snapshot covers it and the current log, which is then kept as is.
+            rotated = os.path.exists(self.log_path) and not os.path.exists(self._compacting_path())
+            if rotated:
+                os.replace(self.log_path, self._compacting_path())
+                self._log_records = 0
+        try:
+            self.save(entries)
+            try:
+                os.remove(self._compacting_path())
+            except FileNotFoundError:
+                pass
+            self.compactions += 1
+        finally:
+            with self._log_lock:
+                self._compacting = False
+
+    def close(self):
+        """Write out queued entries, compact the log into the snapshot and close it."""
+        self.stop()
+        if self.log_path and self._log_records:
+            self.compact()
+        with self._log_lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def get(self, user_id: str, problem_id: str):
+        """The user's best entry for a problem, or None."""
+        return self._entries.get((user_id, problem_id))
+
+    def for_problem(self, problem_id: str) -> list:
+        """Every user's best entry for a problem."""
+        with self._lock:
+            return list(self._by_problem.get(problem_id, {}).values())
+
+    def for_user(self, user_id: str) -> list:
+        """The user's best entry for every problem they submitted to."""
+        with self._lock:
+            return list(self._by_user.get(user_id, {}).values())
+
+    def ranking(self, problem_id: str, limit: int = None) -> list:
+        """A problem's entries, best first."""
+        with self._lock:
+            keys = self._rankings.get(problem_id, [])[:limit]
+            # The last two fields of a rank key are the store key.
+            return [self._entries[key[-2:]] for key in keys]
+
+    def leaderboard(self) -> list:
+        """Every user's best entry per problem as /api/leaderboard rows, best first."""
+        with self._lock:
+            return list(self._leaderboard)
+
+    def problem_ids(self) -> list:
+        with self._lock:
+            return list(self._by_problem)
+
+    def export(self) -> list:
+        """The entries as the list saved in leaderboard.json."""
+        with self._lock:
+            return list(self._entries.values())
+
+    def save(self, entries: list = None):
+        """Atomically replace the snapshot with `entries` (default: the whole store)."""
+        if entries is None:
+            entries = self.export()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f, indent=2, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,82 @@
+import pytest
+
+import checkers
+from checkers import check
+
+DEEP = "[" * 100000 + "]" * 100000
+
+
+def test_exact_ignores_surrounding_whitespace():
+    assert check(None, "  42\n", "42")
+    assert not check("exact", "4 2", "42")
+
+
+def test_tokens_ignores_spacing_between_tokens():
+    assert check("tokens", "1   2\n3", "1 2 3")
+    assert not check("tokens", "1 2", "1 2 3")
+
+
+def test_float_tolerance():
+    spec = {"name": "float", "rel_tol": 1e-6}
+    assert check(spec, "0.3333333", "0.33333333")
+    assert not check(spec, "0.34", "0.33")
+    assert check(spec, "nan", "nan")
+    assert not check(spec, "abc", "1.0")
+
+
+def test_json_ignores_formatting():
+    assert check("json", "[1,2, 3]", "[1, 2, 3]")
+    assert check("json", "(1, 2)", "[1, 2]")
+    assert check("json", "True", "true")
+    assert not check("json", "[1, 2]", "[2, 1]")
+
+
+def test_json_keeps_types_apart():
+    assert not check("json", "1", "true")
+    assert not check("json", "[null, 1, 0]", "[null,true,false]")
+    assert check("json", "[None, True, False]", "[null,true,false]")
+    assert not check("json", "2.0", "2")
+    assert check("json", '{"b": 1, "a": 2}', '{"a": 2, "b": 1}')
+
+
+def test_unordered_keeps_types_apart():
+    assert not check("unordered", "[1, 0]", "[false, true]")
+    assert not check("unordered", "[2.0]", "[2]")
+
+
+def test_json_falls_back_to_exact_for_unparsed_output():
+    assert check("json", "hello", "hello")
+    assert not check("json", "hello", "world")
+
+
+def test_unordered_ignores_list_order():
+    assert check("unordered", "[3, 1, 2]", "[1, 2, 3]")
+    assert not check("unordered", "[[2, 1], [3]]", "[[3], [1, 2]]")
+    assert check({"name": "unordered", "nested": True}, "[[2, 1], [3]]", "[[3], [1, 2]]")
+
+
+def test_unordered_compares_unparsed_output_as_lines():
+    assert check("unordered", "b\na\n", "a\nb")
+    assert not check("unordered", "a\na\n", "a\nb")
+
+
+@pytest.mark.parametrize("spec", ["json", "unordered", {"name": "unordered", "nested": True}])
+@pytest.mark.parametrize("output", ["{1, 2}", "1j", "[{1, 2}]", "{[1]}", DEEP],
+                         ids=["set", "complex", "nested-set", "unhashable", "deep"])
+def test_uncomparable_output_is_a_mismatch(spec, output):
+    assert check(spec, output, "[1, 2]") is False
+
+
+def test_deeply_nested_expected_output_does_not_raise():
+    assert check("json", "[]", DEEP) is False
+
+
+def test_unknown_checker_raises():
+    with pytest.raises(ValueError):
+        check("no-such-checker", "1", "1")
+
+
+def test_is_exact():
+    assert checkers.is_exact(None)
+    assert checkers.is_exact("exact")
+    assert not checkers.is_exact({"name": "float"})
@@ -0,0 +1,60 @@
+from worker_pool import OutputMatcher
+
+
+def feed_all(expected, chunks):
+    matcher = OutputMatcher(expected)
+    return all(matcher.feed(chunk) for chunk in chunks), matcher
+
+
+def test_exact_output_matches():
+    ok, _ = feed_all("1 2 3\n", [b"1 2 3\n"])
+    assert ok
+
+
+def test_output_split_across_chunks_matches():
+    ok, _ = feed_all("hello world", [b"hel", b"lo ", b"wor", b"ld\n"])
+    assert ok
+
+
+def test_surrounding_whitespace_is_ignored():
+    ok, _ = feed_all("\n  42  \n", [b"   ", b"42", b"\n\n\n"])
+    assert ok
+
+
+def test_inner_whitespace_must_match():
+    ok, matcher = feed_all("1 2", [b"1  2"])
+    assert not ok and matcher.diverged
+
+
+def test_trailing_whitespace_before_more_output_counts():
+    ok, _ = feed_all("ab", [b"a ", b"b"])
+    assert not ok
+
+
+def test_divergence_is_reported_on_the_first_wrong_chunk():
+    matcher = OutputMatcher("0\n1\n2\n")
+    assert matcher.feed(b"0\n")
+    assert not matcher.feed(b"7\n")
+    assert not matcher.feed(b"2\n")
+
+
+def test_output_longer_than_expected_diverges():
+    ok, _ = feed_all("abc", [b"abc", b"d"])
+    assert not ok
+
+
+def test_prefix_of_expected_has_not_diverged():
+    # Too short is only known once the case ends; the checker decides then.
+    ok, matcher = feed_all("abcdef", [b"abc"])
+    assert ok and not matcher.diverged
+
+
+def test_multibyte_character_split_across_chunks():
+    data = "π = 3.14".encode("utf-8")
+    ok, _ = feed_all("π = 3.14", [data[:1], data[1:]])
+    assert ok
+
+
+def test_invalid_utf8_diverges_instead_of_raising():
+    ok, _ = feed_all("abc", [b"\xff\xfe"])
+    assert not ok
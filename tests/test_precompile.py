@@ -0,0 +1,17 @@
+import marshal
+
+import pytest
+
+from precompile import InvalidSubmission, compile_submission
+
+
+def test_compiles_a_solve_function():
+    code = marshal.loads(compile_submission("def solve():\n    print(1)\n"))
+    assert "solve" in code.co_names
+
+
+@pytest.mark.parametrize("source", ["def solve(:\n", "x = 1\n", "x = " + "-" * 1000000 + "1\ndef solve(): pass\n"],
+                         ids=["syntax-error", "no-solve", "deep"])
+def test_invalid_code_raises_invalid_submission(source):
+    with pytest.raises(InvalidSubmission):
+        compile_submission(source)
@@ -0,0 +1,17 @@
+from result_cache import ResultCache, code_hash
+
+
+def test_code_hash_ignores_line_endings():
+    assert code_hash("def solve():\r\n    print(1)\r\n") == code_hash("def solve():\n    print(1)\n")
+
+
+def test_code_hash_keeps_whitespace_inside_strings():
+    assert code_hash('print("""a  \n""")\n') != code_hash('print("""a\n""")\n')
+
+
+def test_only_deterministic_outcomes_are_cached(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    for status in ("ok", "error", "wrong", "killed", "timeout", "crash"):
+        cache.put(status, {"status": status, "stdout": "", "stderr": ""})
+    assert [status for status in ("ok", "error", "wrong", "killed", "timeout", "crash")
+            if cache.get(status) is not None] == ["ok", "error", "wrong"]
@@ -0,0 +1,133 @@
+import random
+import time
+
+import submission_store
+from submission_store import SubmissionStore, is_better, leaderboard_row, rank_key
+
+
+def make_entry(rng, user, problem, n):
+    return {"submission_id": f"s{n}", "user_id": user, "problem_id": problem,
+            "score": rng.randint(0, 5), "replay_result": "", "timestamp": f"2025-01-01T00:00:{n:05d}",
+            "execution_time": rng.choice([0.1, 0.2, 0.3]), "error_details": []}
+
+
+def random_entries(seed=0, count=500):
+    rng = random.Random(seed)
+    return [make_entry(rng, f"user{rng.randint(0, 20)}", f"problem{rng.randint(0, 4)}", n) for n in range(count)]
+
+
+def best_entries(entries):
+    best = {}
+    for entry in entries:
+        key = (entry["user_id"], entry["problem_id"])
+        if key not in best or is_better(entry, best[key]):
+            best[key] = entry
+    return list(best.values())
+
+
+def test_leaderboard_after_upserts_matches_a_full_sort():
+    entries = random_entries()
+    store = SubmissionStore()
+    for entry in entries:
+        store.upsert(entry)
+    best = best_entries(entries)
+    assert store.leaderboard() == [leaderboard_row(entry) for entry in sorted(best, key=rank_key)]
+    for problem_id in store.problem_ids():
+        expected = sorted((entry for entry in best if entry["problem_id"] == problem_id), key=rank_key)
+        assert store.ranking(problem_id) == expected
+        assert store.ranking(problem_id, limit=3) == expected[:3]
+
+
+def test_replace_all_matches_upserts():
+    entries = random_entries(seed=1)
+    upserted = SubmissionStore()
+    for entry in entries:
+        upserted.upsert(entry)
+    replaced = SubmissionStore()
+    replaced.replace_all(entries)
+    assert replaced.leaderboard() == upserted.leaderboard()
+    assert sorted(replaced.export(), key=rank_key) == sorted(upserted.export(), key=rank_key)
+
+
+def test_upsert_keeps_only_a_better_entry():
+    store = SubmissionStore()
+    rng = random.Random(2)
+    first = dict(make_entry(rng, "a", "p", 1), score=3, execution_time=0.2)
+    assert store.upsert(first)
+    assert not store.upsert(dict(first, score=2, timestamp="later"))
+    assert not store.upsert(dict(first, execution_time=0.3, timestamp="later"))
+    assert store.upsert(dict(first, execution_time=0.1, timestamp="later"))
+    assert store.get("a", "p")["execution_time"] == 0.1
+    assert len(store.leaderboard()) == 1
+
+
+def open_store(tmp_path):
+    store = SubmissionStore(str(tmp_path / "leaderboard.json"), str(tmp_path / "leaderboard.log"))
+    store.load()
+    return store
+
+
+def test_torn_last_log_line_is_truncated(tmp_path):
+    store = open_store(tmp_path)
+    entries = best_entries(random_entries(seed=3, count=20))
+    for entry in entries:
+        store.record(entry)
+    log = tmp_path / "leaderboard.log"
+    intact = log.read_bytes()
+    log.write_bytes(intact + b'{"user_id": "torn", "prob')
+
+    reloaded = open_store(tmp_path)
+    assert log.read_bytes() == intact
+    assert reloaded.leaderboard() == store.leaderboard()
+
+
+def test_store_round_trips_through_compaction_and_reload(tmp_path):
+    store = open_store(tmp_path)
+    entries = random_entries(seed=4, count=200)
+    for entry in entries[:100]:
+        store.record(entry)
+    store.compact()
+    assert not (tmp_path / "leaderboard.log").exists()
+    assert not (tmp_path / "leaderboard.log.compacting").exists()
+    for entry in entries[100:]:
+        store.record(entry)
+
+    reloaded = open_store(tmp_path)
+    assert reloaded.leaderboard() == store.leaderboard()
+    store.close()
+    assert not (tmp_path / "leaderboard.log").exists()
+    assert open_store(tmp_path).leaderboard() == store.leaderboard()
+
+
+def test_interrupted_compaction_is_replayed(tmp_path):
+    store = open_store(tmp_path)
+    entries = best_entries(random_entries(seed=5, count=50))
+    for entry in entries[:10]:
+        store.record(entry)
+    store.compact()
+    for entry in entries[10:30]:
+        store.record(entry)
+    # The server stopped after rotating the log but before saving the snapshot.
+    (tmp_path / "leaderboard.log").rename(tmp_path / "leaderboard.log.compacting")
+    for entry in entries[30:]:
+        store.record(entry)
+
+    reloaded = open_store(tmp_path)
+    assert reloaded.leaderboard() == store.leaderboard()
+    reloaded.compact()
+    assert not (tmp_path / "leaderboard.log.compacting").exists()
+    assert open_store(tmp_path).leaderboard() == store.leaderboard()
+
+
+def test_log_is_compacted_in_the_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(submission_store, "COMPACT_EVERY", 5)
+    store = open_store(tmp_path)
+    store.start()
+    for entry in best_entries(random_entries(seed=6, count=40)):
+        store.record(entry)
+    store.stop()
+    deadline = time.monotonic() + 5
+    while store.compactions == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.compactions >= 1
+    assert open_store(tmp_path).leaderboard() == store.leaderboard()
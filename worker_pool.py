@@ -0,0 +1,412 @@
+"""
+Pool of pre-warmed sandbox worker processes.
+
+Spawning a fresh interpreter for every test case made interpreter startup the
+dominant cost of grading. Instead, a fixed number of sandbox_worker.py
+processes are started with the server and reused: all test cases of a
+submission are sent to one worker as a single batch over a pipe, and every
+worker is recycled after a fixed number of jobs. The worker kills a case
+that runs past its time limit itself; only a worker that crashes or stops
+answering is killed and replaced. Workers fork a fresh child for every
+case, so no submission sees state left by another.
+
+Each worker runs inside its own scratch directory, on tmpfs (/dev/shm) when
+available, so files a submission writes never reach the shared disk. The
+worker empties it after every job and the pool removes it with the worker.
+
+Every worker runs in its own session and every case in its own process
+group, which anything the submission forks joins: the worker kills the
+case's group when the case ends, and a worker killed because it hung takes
+its own group and its running case's group with it.
+"""
+import codecs
+import json
+import os
+import queue
+import select
+import shutil
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+HEADER = struct.Struct(">I")
+
+DEFAULT_POOL_SIZE = int(os.environ.get("GRADER_POOL_SIZE", os.cpu_count() or 2))
+DEFAULT_MAX_JOBS = int(os.environ.get("GRADER_WORKER_MAX_JOBS", 200))
+SCRATCH_ROOT = os.environ.get("GRADER_SCRATCH_DIR") or (
+    "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+)
+SCRATCH_PREFIX = "grader-"
+# How long past a case's time limit the pool waits for the worker to report
+# the timeout itself before it presumes the worker hung and kills it.
+TIMEOUT_GRACE = 1.0
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def sweep_scratch_dirs():
+    """Remove scratch directories left behind by servers that were killed."""
+    try:
+        entries = list(os.scandir(SCRATCH_ROOT))
+    except OSError:
+        return
+    for entry in entries:
+        if not entry.name.startswith(SCRATCH_PREFIX):
+            continue
+        try:
+            owner = int(entry.name[len(SCRATCH_PREFIX):].split("-", 1)[0])
+        except ValueError:
+            continue
+        if owner != os.getpid() and not _pid_alive(owner):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+class OutputMatcher:
+    """
+    Compares stdout against an expected output as it arrives, using the
+    grader's rule (equal after .strip()), and reports divergence as soon as
+    no continuation could still match.
+    """
+
+    def __init__(self, expected: str):
+        self.expected = expected.strip()
+        self.matched = 0
+        # Whitespace that only counts if more output follows it.
+        self.pending = ""
+        self.diverged = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def feed(self, data: bytes) -> bool:
+        """Compare the next chunk of raw stdout; return False once it can no longer match."""
+        if self.diverged:
+            return False
+        text = self.pending + self._decoder.decode(data)
+        if not self.matched:
+            text = text.lstrip()
+        core = text.rstrip()
+        if not self.expected.startswith(core, self.matched):
+            self.diverged = True
+            return False
+        self.matched += len(core)
+        self.pending = text[len(core):]
+        return True
+
+
+class WorkerDied(Exception):
+    """Raised when a worker exits or closes its pipe in the middle of a job."""
+
+
+class JobTimeout(Exception):
+    """Raised when a worker does not answer before the job deadline."""
+
+
+class _Worker:
+    def __init__(self):
+        self.scratch = tempfile.mkdtemp(prefix=f"{SCRATCH_PREFIX}{os.getpid()}-", dir=SCRATCH_ROOT)
+        # Stop requests for the running case (see sandbox_worker.py).
+        control_r, self._control = os.pipe()
+        try:
+            self.proc = subprocess.Popen(
+                [sys.executable, WORKER_SCRIPT, str(control_r)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                cwd=self.scratch,
+                start_new_session=True,
+                pass_fds=(control_r,),
+            )
+        except BaseException:
+            os.close(self._control)
+            raise
+        finally:
+            os.close(control_r)
+        self.jobs_done = 0
+        # Process group of the case the worker is running (see sandbox_worker.py).
+        self.case_pid = None
+        self._buffer = b""
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def send(self, message, payloads=()):
+        """Send a JSON header followed by raw byte payloads (see sandbox_worker.py)."""
+        if payloads:
+            message = dict(message, payloads=[len(payload) for payload in payloads])
+        body = json.dumps(message).encode("utf-8")
+        try:
+            self.proc.stdin.write(HEADER.pack(len(body)) + body)
+            for payload in payloads:
+                self.proc.stdin.write(payload)
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise WorkerDied(str(e))
+
+    def _read_exact(self, size, deadline):
+        fd = self.proc.stdout.fileno()
+        while len(self._buffer) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise JobTimeout()
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                raise JobTimeout()
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise WorkerDied(f"worker exited with code {self.proc.wait()}")
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def receive(self, deadline):
+        """Read one frame; returns (header, payloads)."""
+        (length,) = HEADER.unpack(self._read_exact(HEADER.size, deadline))
+        message = json.loads(self._read_exact(length, deadline).decode("utf-8"))
+        payloads = [self._read_exact(size, deadline) for size in message.get("payloads", ())]
+        return message, payloads
+
+    def stop_case(self, index):
+        """Ask the worker to kill case `index` of the current job."""
+        try:
+            os.write(self._control, HEADER.pack(index))
+        except OSError:
+            pass
+
+    def kill(self):
+        """Kill the worker's process group and the running case's group."""
+        for pgid in (self.case_pid, self.proc.pid):
+            if pgid is None:
+                continue
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except OSError:
+                pass
+        self.case_pid = None
+        try:
+            self.proc.kill()
+        except OSError:
+            pass
+        self.proc.wait()
+        self._release()
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=1)
+        except Exception:
+            self.kill()
+        self._release()
+
+    def _release(self):
+        if self._control is not None:
+            os.close(self._control)
+            self._control = None
+        shutil.rmtree(self.scratch, ignore_errors=True)
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of sandbox workers shared by all grading requests.
+
+    With a size of 0 no workers are kept around: each batch gets a freshly
+    spawned worker that exits when the batch is done.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_jobs=DEFAULT_MAX_JOBS):
+        self.size = max(0, size)
+        self.max_jobs = max_jobs
+        self._idle = queue.Queue()
+        self._started = False
+        self._lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self._counters = {"spawned": 0, "recycled": 0, "timeouts": 0, "hung": 0, "crashes": 0,
+                          "reaped": 0}
+
+    def _count(self, name, amount=1):
+        if amount:
+            with self._counters_lock:
+                self._counters[name] += amount
+
+    def _spawn(self):
+        self._count("spawned")
+        return _Worker()
+
+    def stats(self) -> dict:
+        """Counters for monitoring; "reaped" counts cases that left processes behind."""
+        with self._counters_lock:
+            stats = dict(self._counters)
+        stats.update(size=self.size, idle=self._idle.qsize())
+        return stats
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            sweep_scratch_dirs()
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+            self._started = True
+
+    def shutdown(self):
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+            for _ in range(self.size):
+                self._idle.get().close()
+
+    def _checkout(self):
+        if self.size == 0:
+            return self._spawn()
+        self.start()
+        return self._idle.get()
+
+    def _checkin(self, worker):
+        if self.size == 0:
+            worker.close()
+        else:
+            self._idle.put(self._recycle(worker))
+
+    def run_batch(self, code: str, inputs, timeout: float, on_result=None, memory_limit_mb=None,
+                  stop_when=None, bytecode=None, output_limit_kb=None, expected_outputs=None):
+        """
+        Run `code` against every input in `inputs` inside a single worker.
+        Inputs (str, bytes or a memoryview, e.g. into a problem pack) are
+        sent as raw bytes and become the submission's stdin.
+
+        `timeout` applies to each case separately and is enforced by the
+        worker. A case that crashes the worker, or leaves it unresponsive
+        past the time limit, gets a replacement worker for the remaining
+        inputs. `memory_limit_mb` caps how much memory a case may allocate.
+        `output_limit_kb` caps what a case may print. With `expected_outputs`
+        a case is stopped, with status "wrong", as soon as its stdout can no
+        longer match; the expected outputs stay in this process.
+        Returns one dict per input with "status" ("ok", "error", "memory",
+        "output", "wrong", "killed", "timeout" or "crash"), "stdout", "stderr",
+        "cpu_time" and "wall_time" in seconds, and "peak_memory_kb".
+        `on_result(index, result)` is called as each case finishes.
+        `bytecode`, a marshal'd code object of `code` (see precompile.py),
+        saves the worker from compiling the source itself.
+
+        If `stop_when(index, result)` returns True the remaining inputs are
+        not run and the shorter list of results is returned. The worker then
+        waits for a go-ahead after every case so it never starts work that
+        is about to be thrown away.
+        """
+        results = []
+        stopped = False
+        step = stop_when is not None
+        raw_inputs = [data if isinstance(data, (bytes, memoryview)) else data.encode("utf-8") for data in inputs]
+
+        def finish(result):
+            nonlocal stopped
+            results.append(result)
+            if on_result is not None:
+                on_result(len(results) - 1, result)
+            if step and stop_when(len(results) - 1, result):
+                stopped = True
+
+        while not stopped and len(results) < len(inputs):
+            pending = raw_inputs[len(results):]
+            payloads = ([bytecode] if bytecode is not None else []) + pending
+            first = len(results)
+            worker = self._checkout()
+            try:
+                start = time.monotonic()
+                try:
+                    worker.send({"code": code, "bytecode": bytecode is not None, "time_limit": timeout,
+                                 "memory_limit_mb": memory_limit_mb, "output_limit_kb": output_limit_kb,
+                                 "step": step}, payloads)
+                    # Sending a large batch can take a while; it is not the case's time.
+                    start = time.monotonic()
+                    for index in range(len(pending)):
+                        matcher = OutputMatcher(expected_outputs[first + index]) if expected_outputs else None
+                        stdout = []
+                        while True:
+                            result, chunks = worker.receive(start + timeout + TIMEOUT_GRACE)
+                            if "pid" in result:
+                                worker.case_pid = result["pid"]
+                                continue
+                            if not result.get("stdout"):
+                                break
+                            stdout.extend(chunks)
+                            if matcher is not None and not matcher.diverged:
+                                if not all(matcher.feed(chunk) for chunk in chunks):
+                                    worker.stop_case(index)
+                        worker.case_pid = None
+                        result.pop("index", None)
+                        result.pop("payloads", None)
+                        result["stdout"] = b"".join(stdout).decode("utf-8", errors="replace")
+                        if matcher is not None and matcher.diverged:
+                            result["status"] = "wrong"
+                        self._count("reaped", result.pop("reaped", 0))
+                        if result["status"] == "timeout":
+                            self._count("timeouts")
+                        result.setdefault("wall_time", time.monotonic() - start)
+                        finish(result)
+                        if step:
+                            worker.send({"continue": not stopped})
+                            if stopped:
+                                break
+                        start = time.monotonic()
+                    worker.jobs_done += 1
+                except JobTimeout:
+                    self._count("hung")
+                    worker.kill()
+                    elapsed = time.monotonic() - start
+                    finish({"status": "timeout", "stdout": "", "stderr": "",
+                            "cpu_time": elapsed, "wall_time": elapsed, "peak_memory_kb": None})
+                except WorkerDied as e:
+                    self._count("crashes")
+                    worker.kill()
+                    finish({"status": "crash", "stdout": "",
+                            "stderr": f"Worker process exited unexpectedly ({e})",
+                            "cpu_time": 0.0, "wall_time": time.monotonic() - start,
+                            "peak_memory_kb": None})
+                except Exception:
+                    worker.kill()
+                    raise
+            finally:
+                self._checkin(worker)
+        return results
+
+    def _recycle(self, worker):
+        if worker.alive() and worker.jobs_done < self.max_jobs:
+            return worker
+        self._count("recycled")
+        worker.close()
+        return self._spawn()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> WorkerPool:
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+        return _pool
+
+
+def start_pool():
+    get_pool().start()
+
+
+def stop_pool():
+    if _pool is not None:
+        _pool.shutdown()